@@ -0,0 +1,58 @@
+""" This module contains the ApiBudget and PacedRequestor classes. """
+
+from typing import Any, Mapping, Optional
+import time
+
+from prawcore import Requestor
+from requests.models import Response
+
+
+class ApiBudget:
+    """
+    Tracks the Reddit API rate limit of an account from the headers of its responses,
+    and paces the requests to spread the remaining budget evenly over the rest of the rate limit window,
+    instead of spending it in bursts and stalling once it runs out.
+    """
+    calls: int
+    remaining: Optional[int]
+    # Monotonic times of the end of the window and of the next request allowed
+    _reset: float
+    _next: float
+
+    def __init__(self):
+        self.calls = 0
+        self.remaining = None
+        self._reset = 0
+        self._next = 0
+
+    def wait(self) -> None:
+        """ Waits until the next request fits in the budget. """
+        delay = self._next - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+        self.calls += 1
+
+    def update(self, headers: Mapping[str, str]) -> None:
+        """ Reads the remaining budget from the rate limit headers of a response, if it has them. """
+        if "x-ratelimit-remaining" not in headers or "x-ratelimit-reset" not in headers:
+            return
+        now = time.monotonic()
+        self.remaining = int(float(headers["x-ratelimit-remaining"]))
+        self._reset = now + float(headers["x-ratelimit-reset"])
+        # An exhausted budget means waiting for the window to reset, otherwise its rest is spread evenly
+        self._next = self._reset if self.remaining <= 0 else now + (self._reset - now) / self.remaining
+
+
+class PacedRequestor(Requestor):
+    """ A praw requestor sending every request to the Reddit API within the ApiBudget of the account. """
+    _budget: ApiBudget
+
+    def __init__(self, *args: Any, budget: ApiBudget, **kwargs: Any):
+        super().__init__(*args, **kwargs)
+        self._budget = budget
+
+    def request(self, *args: Any, timeout: Optional[float] = None, **kwargs: Any) -> Response:
+        self._budget.wait()
+        response = super().request(*args, timeout=timeout, **kwargs)
+        self._budget.update(response.headers)
+        return response
@@ -0,0 +1,67 @@
+""" This module contains the Cache class. """
+
+from threading import Event, Lock
+from typing import Callable, Generic, Optional, TypeVar
+
+from grabbit.deadline import Deadline
+
+K = TypeVar("K")
+V = TypeVar("V")
+
+
+class Cache(Generic[K, V]):
+    """
+    A thread-safe map of results, e.g. of probes or downloads,
+    shared by all threads and all accounts downloaded by the process.
+    Results are computed once: callers asking for a result which is being computed wait for it.
+    """
+    _values: dict[K, V]
+    _in_flight: dict[K, Event]
+    _lock: Lock
+
+    def __init__(self):
+        self._values = {}
+        self._in_flight = {}
+        self._lock = Lock()
+
+    def get(self, key: K) -> Optional[V]:
+        """ Returns the cached value, if there is one. """
+        with self._lock:
+            return self._values.get(key)
+
+    def put(self, key: K, value: V) -> None:
+        """ Caches the value. """
+        with self._lock:
+            self._values[key] = value
+
+    def get_or_compute(self, key: K, compute: Callable[[], Optional[V]]) -> Optional[V]:
+        """
+        Returns the cached value, computing it unless another thread already is, in which case it waits for that one.
+        None and exceptions aren't cached, whoever waited for them tries computing the value on their own.
+        Waiting is bounded by the current Deadline.
+        """
+        deadline = Deadline.current()
+        while True:
+            with self._lock:
+                if key in self._values:
+                    return self._values[key]
+                event = self._in_flight.get(key)
+                if event is None:
+                    event = self._in_flight[key] = Event()
+                    break
+            while not event.wait(timeout=min(1.0, deadline.remaining())):
+                deadline.check()
+
+        try:
+            value = compute()
+            if value is not None:
+                self.put(key, value)
+            return value
+        finally:
+            with self._lock:
+                del self._in_flight[key]
+            event.set()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._values)
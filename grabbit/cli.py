@@ -1,19 +1,247 @@
 """ This module contains the CLI for Grabbit. """
 
+from __future__ import annotations
+
+from json import JSONDecodeError
 import json
 import signal
 import sys
+from itertools import chain
 from pathlib import Path
+from typing import Callable, TYPE_CHECKING
 import logging
 
 import click
 
-from grabbit.grabbit import Grabbit
 from grabbit.logger import GrabbitLogger
-from grabbit.typing_custom import RedditUser
-from grabbit.utils import get_version
+from grabbit.index import MetadataIndex, metadata_files
+from grabbit.pack import PackIndex, extract as extract_packs
+from grabbit.retry import RetryQueue
+from grabbit.shard import write_plan, read_plan, merge_shards
+from grabbit.state import State
+from grabbit.typing_custom import RedditUser, Account, GrabbitConfig, MediaType, LadderStep, Quality, PostStatus, Durability
+from grabbit.verify import Verifier
+from grabbit.utils import get_version, format_size
+
+if TYPE_CHECKING:
+    # Only needed for annotations, importing them would pull in praw and the download machinery
+    from grabbit.budget import ApiBudget
+    from grabbit.downloader import Downloader
+    from grabbit.estimate import Estimate
+    from grabbit.grabbit import Grabbit
+
+# pylint: disable=import-outside-toplevel
+# Grabbit pulls in praw and the download machinery, which would slow down every other command,
+# so the commands that download import it only once they run.
+def new_grabbit(user: RedditUser | None, logger: logging.Logger, config: GrabbitConfig, downloader: Downloader | None = None) -> Grabbit:
+    """ Creates a Grabbit instance, importing it on first use. """
+    from grabbit.grabbit import Grabbit
+    return Grabbit(user=user, logger=logger, config=config, downloader=downloader)
+
+def new_downloader(logger: logging.Logger, config: GrabbitConfig) -> Downloader:
+    """ Creates a Downloader to share between Grabbit instances, importing it on first use. """
+    from grabbit.downloader import Downloader
+    return Downloader(logger, config)
+# pylint: enable=import-outside-toplevel
+
+def parse_ladder(_ctx: click.Context, _param: click.Parameter, value: str | None) -> list[LadderStep] | None:
+    """ Parses a comma separated list of fallback ladder steps. """
+    if value is None:
+        return None
+    try:
+        return [LadderStep(step.strip().lower()) for step in value.split(",")]
+    except ValueError as e:
+        raise click.BadParameter(f"must be a comma separated list of {', '.join(step.value for step in LadderStep)}") from e
+
+def print_version(ctx: click.Context, _param: click.Parameter, value: bool) -> None:
+    """ Prints the version and exits, looking it up only when asked for. """
+    if not value or ctx.resilient_parsing:
+        return
+    click.echo(get_version())
+    ctx.exit()
+
+class DefaultGroup(click.Group):
+    """ A command group which runs the download command unless another command is named. """
+    default_command = "download"
+
+    def parse_args(self, ctx: click.Context, args: list[str]) -> list[str]:
+        if len(args) > 0 and args[0] not in self.commands and args[0] not in [*ctx.help_option_names, "--version"]:
+            args = [self.default_command, *args]
+        return super().parse_args(ctx, args)
+
+@click.group(cls=DefaultGroup)
+@click.option(
+    "--version",
+    is_flag = True,
+    expose_value = False,
+    is_eager = True,
+    callback = print_version,
+    help = "Show the version and exit.",
+)
+def cli():
+    """
+    Reddit Saved Posts Downloader, runs the download command unless another command is given.
+    """
+
+def rendition_options(command: Callable) -> Callable:
+    """ Adds the options picking the rendition of images and videos to a command. """
+    options = [
+        click.option(
+            "--quality",
+            type = click.Choice([quality.value for quality in Quality]),
+            default = Quality.FULL.value,
+            show_default = True,
+            help = "Download full size images, or the resized previews made by Reddit (videos are capped at 720p).",
+        ),
+        click.option(
+            "--max-height",
+            metavar="PIXELS",
+            type = click.IntRange(min=1),
+            help = "Download the largest rendition of images and videos no taller than this.",
+        ),
+    ]
+    for option in reversed(options):
+        command = option(command)
+    return command
+
+def config_options(command: Callable) -> Callable:
+    """ Adds the options tuning how posts are downloaded to a command. """
+    options = [
+        click.option(
+            "--max-attempts",
+            metavar="N",
+            type = click.IntRange(min=1),
+            default = 5,
+            show_default = True,
+            help = "Give up on a failed post after this many attempts.",
+        ),
+        click.option(
+            "--queue-budget",
+            metavar="TYPE N",
+            type = (click.Choice([media_type.name.lower() for media_type in MediaType]), click.IntRange(min=1)),
+            multiple = True,
+            help = "Number of posts of a media type (text, image, gallery, video, unknown) downloaded concurrently.",
+        ),
+        click.option(
+            "--post-timeout",
+            metavar="SECONDS",
+            type = click.FloatRange(min=0, min_open=True),
+            help = "Give up on a post after spending this long trying to download it.",
+        ),
+        click.option(
+            "--ladder",
+            metavar="STEPS",
+            callback = parse_ladder,
+            help = "Order of places to download media from, e.g. original,redirect,preview,wayback.",
+        ),
+        rendition_options,
+        click.option(
+            "--race-preview",
+            metavar="SECONDS",
+            type = click.FloatRange(min=0, min_open=True),
+            help = "Download the Reddit preview of images alongside the original, keeping it if the original takes longer than this.",
+        ),
+        click.option(
+            "--no-metadata-files",
+            is_flag = True,
+            help = "Only keep metadata in the index, don't write a JSON file per post.",
+        ),
+        click.option(
+            "--pack-size",
+            metavar="MB",
+            type = click.IntRange(min=1),
+            help = "Append posts to tar packs of about this size instead of keeping loose files.",
+        ),
+        click.option(
+            "--bandwidth",
+            metavar="MB/S",
+            type = click.FloatRange(min=0, min_open=True),
+            help = "Cap the bandwidth of all downloads together, in megabytes per second.",
+        ),
+        click.option(
+            "--write-buffer",
+            metavar="KB",
+            type = click.IntRange(min=4),
+            default = 1024,
+            show_default = True,
+            help = "Size of the buffer downloaded files are written through.",
+        ),
+        click.option(
+            "--durability",
+            type = click.Choice([durability.value for durability in Durability]),
+            default = Durability.NEVER.value,
+            show_default = True,
+            help = "Sync every downloaded file to the disk, every batch of posts whenever the state is saved, or leave it to the OS.",
+        ),
+        click.option(
+            "--raw-listings",
+            is_flag = True,
+            help = "Read posts straight from the JSON of Reddit listings, never making a request per post.",
+        ),
+    ]
+    for option in reversed(options):
+        command = option(command)
+    return command
+
+# pylint: disable=too-many-arguments, too-many-locals
+# Each argument is a command line option supplied by click.
+def build_config(*, max_attempts: int, queue_budget: tuple[tuple[str, int], ...], post_timeout: float | None,
+                 ladder: list[LadderStep] | None, quality: str, max_height: int | None, race_preview: float | None, no_metadata_files: bool,
+                 pack_size: int | None, bandwidth: float | None, write_buffer: int, durability: str, raw_listings: bool) -> GrabbitConfig:
+    """ Builds the configuration from the options added by config_options. """
+    config = GrabbitConfig(max_attempts=max_attempts, post_timeout=post_timeout, quality=Quality(quality), max_height=max_height,
+                           race_preview=race_preview, metadata_files=not no_metadata_files, pack_size=pack_size * 1024 * 1024 if pack_size is not None else None,
+                           bandwidth=bandwidth * 1024 * 1024 if bandwidth is not None else None, write_buffer=write_buffer * 1024,
+                           durability=Durability(durability), raw_listings=raw_listings)
+    if ladder is not None:
+        config.ladder = ladder
+    for (media_type, budget) in queue_budget:
+        config.queue_budgets[MediaType[media_type.upper()]] = budget
+    return config
+
+def load_user(user_config: Path) -> RedditUser:
+    """ Reads the Reddit user credentials. """
+    with open(user_config, encoding="utf-8") as f:
+        return RedditUser(**json.load(f))
+
+def load_accounts(accounts_file: Path) -> list[Account]:
+    """ Reads the list of accounts, paths in it are relative to the file. """
+    with open(accounts_file, encoding="utf-8") as f:
+        entries = json.load(f)
+    base = accounts_file.parent
+    return [Account(
+        user_config=base / entry["user_config"],
+        output_dir=base / entry["output_dir"],
+        csv=base / entry["csv"] if entry.get("csv") is not None else None,
+    ) for entry in entries]
+
+def report_estimate(logger: logging.Logger, estimate: Estimate, probed: bool) -> None:
+    """ Logs the estimate made by a dry run. """
+    logger.info("%d posts to download 📋", estimate.posts)
+    for (media_type, count) in estimate.media_types.most_common():
+        logger.info("  %s: %d", media_type.name.lower(), count)
+    logger.info("Top sources:")
+    for (host, count) in estimate.hosts.most_common(10):
+        logger.info("  %s: %d", host, count)
+    if probed:
+        logger.info("Expected size: %s, plus %d posts of unknown size (e.g. videos)", format_size(estimate.size), estimate.unsized)
+    logger.info("Posts likely to need the Wayback Machine: %d", estimate.gone)
 
-@click.command()
+def report_api_usage(logger: logging.Logger, budget: ApiBudget) -> None:
+    """ Logs the number of Reddit API calls made with the account. """
+    if budget.remaining is None:
+        logger.info("Made %d Reddit API calls", budget.calls)
+    else:
+        logger.info("Made %d Reddit API calls, %d left in the current rate limit window", budget.calls, budget.remaining)
+
+def report_completion(logger: logging.Logger, stopped: bool) -> None:
+    """ Logs the end of a download, which may have been stopped by Ctrl+C. """
+    if stopped:
+        logger.info("Download stopped, the progress so far is saved 💾")
+    else:
+        logger.info("Download process completed! 🎉")
+
+@cli.command()
 @click.argument("output_dir", type = Path)
 @click.argument("user_config", type = Path)
 @click.option(
@@ -32,43 +260,384 @@ from grabbit.utils import get_version
     is_flag = True,
     help = "Skip previously failed downloads.",
 )
-@click.version_option(get_version(), message="%(version)s")
-def cli(output_dir: Path, user_config: Path, debug: bool, csv: Path, skip_failed: bool):
+@click.option(
+    "--only-failed",
+    is_flag = True,
+    help = "Only retry previously failed downloads that are due.",
+)
+@click.option(
+    "--dry-run",
+    is_flag = True,
+    help = "Don't download anything, only report what would be downloaded.",
+)
+@click.option(
+    "--probe",
+    is_flag = True,
+    help = "With --dry-run, look up the size of images and galleries with HEAD requests.",
+)
+@config_options
+# pylint: disable=too-many-arguments, too-many-positional-arguments, too-many-locals
+# Each argument is a command line option supplied by click.
+def download(output_dir: Path, user_config: Path, debug: bool, csv: Path, skip_failed: bool, only_failed: bool,
+             dry_run: bool, probe: bool, **options):
     """
+    Downloads the Saved Posts of a Reddit user.
+
     OUTPUT_DIR is the directory where the downloaded files will be saved
     USER_CONFIG is the path to a JSON file containing Reddit user credentials
     """
-    def exit_handler(*_):
-        logger.info("Ctrl+C detected! Saving data before exit...")
-        grabbit.exit()
-        sys.exit(0)
+    def stop_handler(*_):
+        logger.info("Ctrl+C detected! Stopping the downloads in flight and saving data before exit...")
+        grabbit.stop()
 
     logger = GrabbitLogger(level=logging.DEBUG if debug else logging.INFO)
 
     logger.info("Welcome to Grabbit! 🐰")
 
     logger.debug("Reading user configuration")
-    with open(user_config, encoding="utf-8") as f:
-        config = json.load(f)
-        user = RedditUser(**config)
+    user = load_user(user_config)
 
-    grabbit = Grabbit(user=user, logger=logger)
+    grabbit = new_grabbit(user=user, logger=logger, config=build_config(**options))
     if not grabbit.logged_in():
         logger.error("Failed to log in to Reddit, check your credentials")
         sys.exit(1)
     logger.info("Accessing Reddit as user %s", user.username)
 
     logger.set_grabbit(grabbit)
-    signal.signal(signal.SIGINT, exit_handler)
 
     logger.info("Initializing 🔧")
+    grabbit.init(output_dir, dry_run=dry_run)
+
+    if dry_run:
+        logger.info("Estimating the download, nothing will be downloaded 🔍")
+        if only_failed:
+            posts = grabbit.failed_posts()
+        else:
+            posts = grabbit.csv_posts(csv) if csv is not None else grabbit.saved_posts()
+            if not skip_failed:
+                posts = chain(posts, grabbit.failed_posts())
+        report_estimate(logger, grabbit.estimate(posts, probe=probe), probe)
+        grabbit.exit(save=False)
+        report_api_usage(logger, grabbit.api_budget)
+        return
+
+    # A dry run has nothing to save, Ctrl+C interrupts it right away
+    signal.signal(signal.SIGINT, stop_handler)
+    # Saved and closed even if the download fails, so the state and the packs stay usable
+    try:
+        if only_failed:
+            logger.info("Retrying previously failed posts 🚀")
+            grabbit.download_failed()
+        elif csv is not None:
+            logger.info("Downloading posts specified in CSV file %s 🚀", csv)
+            grabbit.download_csv(csv_path=csv, skip_failed=skip_failed)
+        else:
+            logger.info("Downloading all Saved Posts 🚀")
+            grabbit.download_saved(skip_failed=skip_failed)
+    finally:
+        grabbit.exit()
+    report_api_usage(logger, grabbit.api_budget)
+    report_completion(logger, grabbit.stopped)
+
+@cli.command()
+@click.argument("accounts_file", type = Path)
+@click.option(
+    "--debug", "-d",
+    is_flag = True,
+    help = "Turn on activate debug mode.",
+)
+@click.option(
+    "--skip-failed",
+    is_flag = True,
+    help = "Skip previously failed downloads.",
+)
+@config_options
+def accounts(accounts_file: Path, debug: bool, skip_failed: bool, **options):
+    """
+    Downloads the Saved Posts of several Reddit users, one after another.
+
+    The accounts share connections, lookups and files, media saved by several of them is only downloaded once.
+    Each account keeps its own Reddit session, state and output directory.
+
+    ACCOUNTS_FILE is the path to a JSON list of accounts, each with a user_config, an output_dir and optionally a csv
+    """
+    current: list[Grabbit] = []
+
+    def stop_handler(*_):
+        logger.info("Ctrl+C detected! Stopping the downloads in flight and saving data before exit...")
+        downloader.stop()
+        for grabbit in current:
+            grabbit.stop()
+
+    logger = GrabbitLogger(level=logging.DEBUG if debug else logging.INFO)
+    logger.info("Welcome to Grabbit! 🐰")
+
+    config = build_config(**options)
+    downloader = new_downloader(logger, config)
+    signal.signal(signal.SIGINT, stop_handler)
+
+    failed = 0
+    for account in load_accounts(accounts_file):
+        if downloader.stopped:
+            break
+        user = load_user(account.user_config)
+        grabbit = new_grabbit(user=user, logger=logger, config=config, downloader=downloader)
+        if not grabbit.logged_in():
+            logger.error("Failed to log in to Reddit as user %s, check the credentials in %s", user.username, account.user_config)
+            failed += 1
+            continue
+        logger.info("Accessing Reddit as user %s", user.username)
+
+        logger.set_grabbit(grabbit)
+        grabbit.init(account.output_dir)
+        current[:] = [grabbit]
+
+        try:
+            if account.csv is not None:
+                logger.info("Downloading posts specified in CSV file %s 🚀", account.csv)
+                grabbit.download_csv(csv_path=account.csv, skip_failed=skip_failed)
+            else:
+                logger.info("Downloading all Saved Posts 🚀")
+                grabbit.download_saved(skip_failed=skip_failed)
+        finally:
+            grabbit.exit()
+        current.clear()
+        report_api_usage(logger, grabbit.api_budget)
+
+    if failed > 0:
+        logger.error("Failed to log in to %d accounts", failed)
+        sys.exit(1)
+    report_completion(logger, downloader.stopped)
+
+@cli.command()
+@click.argument("output_dir", type = Path)
+@click.argument("user_config", type = Path)
+@click.option(
+    "--debug", "-d",
+    is_flag = True,
+    help = "Turn on activate debug mode.",
+)
+@click.option(
+    "--csv",
+    metavar="FILENAME",
+    type = Path,
+    help = "Use Reddit GDPR saved posts export CSV file.",
+)
+@click.option(
+    "--shards",
+    metavar="N",
+    type = click.IntRange(min=1),
+    default = 1,
+    show_default = True,
+    help = "Number of manifests to split the posts into.",
+)
+@click.option(
+    "--plan-dir",
+    metavar="DIRECTORY",
+    type = Path,
+    help = "Where to write the manifests, OUTPUT_DIR/plan by default.",
+)
+@click.option(
+    "--skip-failed",
+    is_flag = True,
+    help = "Leave out previously failed posts due for a retry.",
+)
+@click.option(
+    "--raw-listings",
+    is_flag = True,
+    help = "Read posts straight from the JSON of Reddit listings, never making a request per post.",
+)
+@rendition_options
+# pylint: disable=too-many-arguments, too-many-positional-arguments
+# Each argument is a command line option supplied by click.
+def plan(output_dir: Path, user_config: Path, debug: bool, csv: Path, shards: int, plan_dir: Path | None, skip_failed: bool,
+         raw_listings: bool, quality: str, max_height: int | None):
+    """
+    Splits the posts yet to be downloaded into shards.
+
+    Each shard manifest can be downloaded on a different machine with the run command.
+    Previously failed posts due for a retry are included, unless --skip-failed is given.
+    The manifests hold the URLs of the image renditions picked by --quality and --max-height,
+    run the shards with the same options.
+
+    OUTPUT_DIR is the directory where the downloaded files are saved
+    USER_CONFIG is the path to a JSON file containing Reddit user credentials
+    """
+    logger = GrabbitLogger(level=logging.DEBUG if debug else logging.INFO)
+    config = GrabbitConfig(raw_listings=raw_listings, quality=Quality(quality), max_height=max_height)
+    grabbit = new_grabbit(user=load_user(user_config), logger=logger, config=config)
+    if not grabbit.logged_in():
+        logger.error("Failed to log in to Reddit, check your credentials")
+        sys.exit(1)
     grabbit.init(output_dir)
 
-    if csv is not None:
-        logger.info("Downloading posts specified in CSV file %s 🚀", csv)
-        grabbit.download_csv(csv_path=csv, skip_failed=skip_failed)
-    else:
-        logger.info("Downloading all Saved Posts 🚀")
-        grabbit.download_saved(skip_failed=skip_failed)
+    logger.info("Planning %s 🗺️", f"posts specified in CSV file {csv}" if csv is not None else "all Saved Posts")
+    posts = grabbit.csv_posts(csv) if csv is not None else grabbit.saved_posts()
+    if not skip_failed:
+        posts = chain(posts, grabbit.failed_posts())
+    try:
+        counts = write_plan(posts, plan_dir if plan_dir is not None else output_dir / "plan", shards)
+    finally:
+        grabbit.exit()
+    report_api_usage(logger, grabbit.api_budget)
+
+    for (path, count) in counts.items():
+        logger.info("%s: %d posts", path, count)
+
+@cli.command()
+@click.argument("manifest", type = Path)
+@click.argument("output_dir", type = Path)
+@click.option(
+    "--debug", "-d",
+    is_flag = True,
+    help = "Turn on activate debug mode.",
+)
+@config_options
+def run(manifest: Path, output_dir: Path, debug: bool, **options):
+    """
+    Downloads the posts of a shard manifest.
+
+    The manifests are made by the plan command.
+    The state of the shard is kept in OUTPUT_DIR/.shards, so several machines can share one OUTPUT_DIR.
+    Fold it into the state of the archive with the merge command.
+
+    MANIFEST is the path to a shard manifest
+    OUTPUT_DIR is the directory where the downloaded files will be saved
+    """
+    def stop_handler(*_):
+        logger.info("Ctrl+C detected! Stopping the downloads in flight and saving data before exit...")
+        grabbit.stop()
+
+    logger = GrabbitLogger(level=logging.DEBUG if debug else logging.INFO)
+    grabbit = new_grabbit(user=None, logger=logger, config=build_config(**options))
+    logger.set_grabbit(grabbit)
+    signal.signal(signal.SIGINT, stop_handler)
+    grabbit.init(output_dir, state_dir=output_dir / ".shards" / manifest.stem)
+
+    logger.info("Downloading posts of shard %s 🚀", manifest.stem)
+    try:
+        grabbit.download_posts(read_plan(manifest))
+    finally:
+        grabbit.exit()
+    report_completion(logger, grabbit.stopped)
+
+@cli.command()
+@click.argument("output_dir", type = Path)
+@click.argument("shard_dirs", type = Path, nargs = -1)
+def merge(output_dir: Path, shard_dirs: tuple[Path, ...]):
+    """
+    Folds the state of shards into the state of the archive.
+
+    OUTPUT_DIR is the directory where the downloaded files are saved
+    SHARD_DIRS are the state directories of the shards, all of OUTPUT_DIR/.shards by default
+    """
+    logger = GrabbitLogger()
+    if len(shard_dirs) == 0:
+        shard_dirs = tuple(sorted(path for path in (output_dir / ".shards").glob("*") if path.is_dir()))
+
+    count = merge_shards(output_dir, shard_dirs)
+    logger.info("Merged %d shards 🧩", count)
+
+@cli.command()
+@click.argument("output_dir", type = Path)
+@click.option(
+    "--debug", "-d",
+    is_flag = True,
+    help = "Turn on activate debug mode.",
+)
+@click.option(
+    "--hash", "hash_files",
+    is_flag = True,
+    help = "Also compare checksums, which reads every file.",
+)
+@click.option(
+    "--workers",
+    metavar="N",
+    type = click.IntRange(min=1),
+    default = 16,
+    show_default = True,
+    help = "Number of files checked concurrently.",
+)
+@click.option(
+    "--dry-run",
+    is_flag = True,
+    help = "Only report broken posts, don't mark them for download.",
+)
+# pylint: disable=too-many-arguments, too-many-positional-arguments
+# Each argument is a command line option supplied by click.
+def verify(output_dir: Path, debug: bool, hash_files: bool, workers: int, dry_run: bool):
+    """
+    Checks the files of downloaded posts.
+
+    Posts with missing or incomplete files are marked as failed to be downloaded again by the next run.
+
+    OUTPUT_DIR is the directory where the downloaded files are saved
+    """
+    logger = GrabbitLogger(level=logging.DEBUG if debug else logging.INFO)
+
+    state = State()
+    state.load(output_dir / "db.json")
+    retries = RetryQueue()
+    retries.load(output_dir / "retry.json")
+
+    index = MetadataIndex(output_dir / "index.db") if (output_dir / "index.db").exists() else None
+    packs = PackIndex(output_dir / "packs.db", output_dir / "packs") if (output_dir / "packs.db").exists() else None
+
+    logger.info("Verifying %d posts 🔍", len(state))
+    broken = Verifier(output_dir, logger, workers=workers, hash_files=hash_files).verify(state, index, packs)
+    for (post_id, reason) in broken.items():
+        logger.info("❌ Post %s is broken - %s", post_id, reason)
+        state[post_id] = PostStatus.FAILED
+        retries.forget(post_id)
+
+    if not dry_run and len(broken) > 0:
+        state.save(output_dir / "db.json")
+        retries.save(output_dir / "retry.json")
+        logger.info("Marked %d broken posts for download 🔧", len(broken))
+
+@cli.command("index")
+@click.argument("output_dir", type = Path)
+def index_command(output_dir: Path):
+    """
+    Adds existing metadata files to the index.
+
+    Needed once for archives downloaded before the index existed.
+
+    OUTPUT_DIR is the directory where the downloaded files are saved
+    """
+    logger = GrabbitLogger()
+
+    index = MetadataIndex(output_dir / "index.db")
+    count = 0
+    for path in metadata_files(output_dir):
+        try:
+            with open(path, "r", encoding="utf-8") as file:
+                index.add(json.load(file))
+            count += 1
+        except (JSONDecodeError, KeyError) as e:
+            logger.warning("Skipping unreadable metadata file %s: %s", path, e)
+    logger.info("Indexed %d posts, %d in total 🗂️", count, len(index))
+    index.close()
+
+@cli.command()
+@click.argument("output_dir", type = Path)
+@click.argument("destination", type = Path)
+@click.argument("patterns", nargs = -1)
+def extract(output_dir: Path, destination: Path, patterns: tuple[str, ...]):
+    """
+    Writes the files of packed posts as loose files.
+
+    OUTPUT_DIR is the directory where the downloaded files are saved
+    DESTINATION is the directory where the files are written, in the same layout as an unpacked archive
+    PATTERNS are optional glob patterns of the files to extract, e.g. 'pics/*' or '*/abc123*'
+    """
+    logger = GrabbitLogger()
+
+    if not (output_dir / "packs.db").exists():
+        logger.error("%s has no packs, run merge first if they were made by shards", output_dir)
+        sys.exit(1)
 
-    logger.info("Download process completed! 🎉")
+    packs = PackIndex(output_dir / "packs.db", output_dir / "packs")
+    count = extract_packs(packs, destination, patterns)
+    packs.close()
+    logger.info("Extracted %d files 📦", count)
@@ -0,0 +1,65 @@
+""" This module contains the Deadline class. """
+
+from contextvars import ContextVar, Token
+from threading import Event
+from typing import Optional
+import math
+import time
+
+class DeadlineExceededException(Exception):
+    """ Raised when the time budget of a post is used up. """
+
+class Deadline:
+    """
+    A time budget shared by every request made on behalf of a single post.
+    Entering a Deadline makes it the current one for the calling thread,
+    so HTTPClient and the video downloader can bound their timeouts, retries and sleeps by it.
+    Setting its stop event, e.g. when the user interrupts the run, ends the deadline right away.
+    """
+    _current: ContextVar[Optional["Deadline"]] = ContextVar("deadline", default=None)
+
+    _expires: float
+    _stop: Optional[Event]
+    _token: Optional[Token] = None
+
+    def __init__(self, seconds: Optional[float] = None, stop: Optional[Event] = None):
+        self._expires = time.monotonic() + seconds if seconds is not None else math.inf
+        self._stop = stop
+
+    def __enter__(self) -> "Deadline":
+        self._token = self._current.set(self)
+        return self
+
+    def __exit__(self, *_) -> None:
+        self._current.reset(self._token)
+
+    @classmethod
+    def current(cls) -> "Deadline":
+        """ Returns the deadline of the calling thread, or an unlimited one if there is none. """
+        deadline = cls._current.get()
+        return deadline if deadline is not None else Deadline()
+
+    def remaining(self) -> float:
+        """ Returns the number of seconds left. """
+        if self._stop is not None and self._stop.is_set():
+            return 0
+        return self._expires - time.monotonic()
+
+    def check(self) -> None:
+        """ Raises DeadlineExceededException if the deadline has passed. """
+        if self.remaining() <= 0:
+            raise DeadlineExceededException("Post time budget exceeded")
+
+    def clamp(self, timeout: float) -> float:
+        """ Returns the timeout shortened to the time left. """
+        self.check()
+        return min(timeout, self.remaining())
+
+    def sleep(self, seconds: float) -> None:
+        """ Sleeps, unless the deadline would pass in the meantime, in which case it gives up right away. """
+        if seconds >= self.remaining():
+            raise DeadlineExceededException(f"Post time budget exceeded, not sleeping for {seconds:g}s")
+        if self._stop is None:
+            time.sleep(seconds)
+        elif self._stop.wait(seconds):
+            raise DeadlineExceededException("Stopped while sleeping")
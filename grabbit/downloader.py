@@ -1,27 +1,39 @@
 """ This module contains the Downloader class. """
 
 from __future__ import unicode_literals
+from concurrent.futures import ThreadPoolExecutor
+from contextvars import copy_context
 from pathlib import Path
-from time import sleep
-from typing import Optional
+from threading import Event
+from typing import Callable, Optional
 from logging import Logger
+import re
+
+from urllib.parse import urlparse
 
-from praw.models.reddit.base import urlparse
 from requests import HTTPError
-from yt_dlp import YoutubeDL
-from yt_dlp.utils import DownloadError
 
-from grabbit.utils import guess_media_type, guess_media_extension, NullLogger
-from grabbit.typing_custom import Post, MediaType
+from grabbit.cache import Cache
+from grabbit.utils import guess_media_type, guess_media_extension, link_or_copy, NullLogger
+from grabbit.typing_custom import Post, MediaType, LadderStep, GrabbitConfig, Quality
+from grabbit.deadline import Deadline, DeadlineExceededException
 from grabbit.wayback import Wayback
-from grabbit.httpclient import HTTPClient, RetryLimitExceededException
+from grabbit.health import CircuitBreaker, DeadLinks
+from grabbit.transfer import Transfer
+from grabbit.httpclient import HTTPClient, RetryLimitExceededException, DeadLinkException
 
 # pylint: disable=too-few-public-methods
 # This is by design. While it potentially could be a single function,
 # Downloader being a class allows it to hold its instances of Logger, HTTPClient and Wayback
 # making the usage more concise and readable than passing those as arguments of a function.
+# pylint: disable=too-many-instance-attributes
+# Besides its settings, Downloader holds the caches shared by every account downloaded by the process.
 class Downloader:
-    """ Handles downloading media from Reddit. """
+    """
+    Handles downloading media from Reddit.
+    A single instance can be shared by several Grabbit instances, which then reuse its connections,
+    probes and already downloaded files.
+    """
     _headers = {"User-Agent": "Mozilla/5.0 (Macintosh; Intel Mac OS X 10.15; rv:135.0) Gecko/20100101 Firefox/135.0"}
 
     _sources = {
@@ -40,54 +52,186 @@ class Downloader:
         ]
     }
 
+    _preview_video_height = 720
+
+    # The steps downloading the original image and the preview at once, when racing them
+    _raced_steps = [LadderStep.ORIGINAL, LadderStep.REDIRECT, LadderStep.PREVIEW]
+
+    # Imgur redirects removed images to a placeholder instead of answering 404
+    _removed_placeholders = ["https://i.imgur.com/removed.png", "https://imgur.com/"]
+
+    # YTDL errors telling of the host rather than of a single video, e.g. unlike "Video unavailable" or "Private video"
+    _host_errors = re.compile(r"HTTP Error (429|5\d\d)|timed out|Errno 61|Connection (refused|reset)")
+
     _logger: Logger
     _http_client: HTTPClient
     _wayback: Wayback
-
-    def __init__(self, logger: Logger):
+    _ladder: list[LadderStep]
+    _post_timeout: Optional[float]
+    _race_timeout: Optional[float]
+    _video_format: Optional[str]
+
+    _transfer: Transfer
+    _redirects: Cache[str, str]
+    _guesses: Cache[str, MediaType]
+    _files: Cache[str, Path]
+    _stop: Event
+
+    def __init__(self, logger: Logger, config: GrabbitConfig | None = None):
+        config = config if config is not None else GrabbitConfig()
         self._logger = logger
-        self._http_client = HTTPClient(self._headers, logger)
+        self._http_client = HTTPClient(self._headers, logger, CircuitBreaker(config.breaker_threshold, config.breaker_cooldown))
         self._wayback = Wayback(self._http_client)
+        self._ladder = config.ladder
+        self._post_timeout = config.post_timeout
+
+        max_video_height = config.max_height if config.max_height is not None else (self._preview_video_height if config.quality is Quality.PREVIEW else None)
+        self._race_timeout = config.race_preview
+        self._video_format = f"bestvideo[height<=?{max_video_height}]+bestaudio/best[height<=?{max_video_height}]" if max_video_height is not None else None
+
+        self._transfer = Transfer(config.bandwidth, config.write_buffer, config.durability)
+        self._redirects = Cache()
+        self._guesses = Cache()
+        self._files = Cache()
+        self._stop = Event()
+
+    @property
+    def dead_links(self) -> DeadLinks:
+        """ The URLs known to be gone, to be persisted between runs. """
+        return self._http_client.dead_links
+
+    @property
+    def stopped(self) -> bool:
+        """ Whether stop was called. """
+        return self._stop.is_set()
+
+    def stop(self) -> None:
+        """ Makes the downloads in flight give up at their next deadline check, e.g. when the user interrupts the run. """
+        self._stop.set()
+
+    def flush(self) -> None:
+        """ Makes the files downloaded since the last flush durable, if they are synced in batches. """
+        self._transfer.flush()
 
     def download(self, post: Post, target: Path) -> list[Path]:
-        """ Attempts to download the media from the post. """
-        if post.url:
-            self._logger.debug(f"Attempting regular download: {post.url}")
-            files = self._download_media(post, post.url, target)
+        """
+        Attempts to download the media from the post, walking the fallback ladder until a step succeeds.
+        Raises DeadlineExceededException if the post runs out of its time budget.
+        """
+        ladder = self._ladder
+        # The preview holds the resized rendition of the image, which is what was asked for
+        if post.downscaled and post.source in self._sources["image"] and LadderStep.PREVIEW in ladder:
+            ladder = [LadderStep.PREVIEW, *[step for step in ladder if step is not LadderStep.PREVIEW]]
+
+        with Deadline(self._post_timeout, self._stop):
+            if self._race_timeout is not None and self._races_preview(post):
+                files = self._race_preview(post, target, self._race_timeout)
+                if len(files) > 0:
+                    return files
+                ladder = [step for step in ladder if step not in self._raced_steps]
+            return self._walk(ladder, post, target)
+
+    def _walk(self, ladder: list[LadderStep], post: Post, target: Path) -> list[Path]:
+        steps = {
+            LadderStep.ORIGINAL: self._download_original,
+            LadderStep.REDIRECT: self._download_redirected,
+            LadderStep.WAYBACK: self._download_wayback,
+            LadderStep.PREVIEW: self._download_preview,
+        }
+
+        for step in ladder:
+            try:
+                files = steps[step](post, target)
+            except RetryLimitExceededException as e:
+                self._logger.debug(f"Giving up on {step.value} download: {e}")
+                continue
             if len(files) > 0:
                 return files
+        return []
 
-            redirected_url = self._follow_redirects(post.url)
-            if redirected_url != post.url:
-                self._logger.debug(f"Attempting download from redirected URL: {redirected_url}")
-                files = self._download_media(post, redirected_url, target)
-                if len(files) > 0:
-                    return files
+    def _races_preview(self, post: Post) -> bool:
+        return (not post.downscaled and LadderStep.PREVIEW in self._ladder and bool(post.url) and bool(post.url_preview)
+                and post.source in self._sources["image"] and len(post.data) <= 1)
+
+    def _race_preview(self, post: Post, target: Path, timeout: float) -> list[Path]:
+        """
+        Downloads the original image and the Reddit preview at the same time.
+        The original is kept if it arrives within the timeout, the preview otherwise,
+        so a dead image host doesn't send the post down the Wayback Machine captures.
+        """
+        preview_target = target.with_name(f"{target.name}-preview")
+        original_steps = [step for step in self._ladder if step in self._raced_steps and step is not LadderStep.PREVIEW]
+        # Each thread gets a copy of the context, so both are bound by the deadline of the post
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            preview = executor.submit(copy_context().run, self._walk, [LadderStep.PREVIEW], post, preview_target)
+            original = executor.submit(copy_context().run, self._race_original, original_steps, post, target, timeout)
+            (files, preview_files) = (original.result(), preview.result())
+
+        if len(files) > 0:
+            for file in preview_files:
+                file.unlink(missing_ok=True)
+            return files
+        if len(preview_files) > 0:
+            self._logger.debug("Original image didn't arrive in time, keeping the Reddit preview")
+        return [file.replace(target.with_suffix(file.suffix)) for file in preview_files]
+
+    def _race_original(self, ladder: list[LadderStep], post: Post, target: Path, timeout: float) -> list[Path]:
+        post_deadline = Deadline.current()
+        try:
+            with Deadline(min(timeout, post_deadline.remaining()), self._stop):
+                return self._walk(ladder, post, target)
+        except DeadlineExceededException:
+            post_deadline.check()
+            self._logger.debug(f"Original image didn't arrive within {timeout:g}s")
+            return []
 
-            self._logger.debug("Attempting download from Wayback Machine")
-            urls = self._wayback.get(post.url)
-            if len(urls) == 0:
-                self._logger.debug("No Wayback Machine captures found")
-            for (count, url) in enumerate(urls):
-                self._logger.debug(f"Attempting wayback machine download {count + 1}/{len(urls)}: {url}")
+    def _download_original(self, post: Post, target: Path) -> list[Path]:
+        if not post.url:
+            return []
+        self._logger.debug(f"Attempting regular download: {post.url}")
+        return self._download_media(post, post.url, target)
+
+    def _download_redirected(self, post: Post, target: Path) -> list[Path]:
+        if not post.url:
+            return []
+        redirected_url = self._follow_redirects(post.url)
+        if redirected_url == post.url:
+            return []
+        self._logger.debug(f"Attempting download from redirected URL: {redirected_url}")
+        return self._download_media(post, redirected_url, target)
+
+    def _download_wayback(self, post: Post, target: Path) -> list[Path]:
+        if not post.url:
+            return []
+        self._logger.debug("Attempting download from Wayback Machine")
+        urls = self._wayback.get(post.url)
+        if len(urls) == 0:
+            self._logger.debug("No Wayback Machine captures found")
+        for (count, url) in enumerate(urls):
+            self._logger.debug(f"Attempting wayback machine download {count + 1}/{len(urls)}: {url}")
+            try:
                 # noinspection PyTypeChecker
                 files = self._download_media(post, url, target)
-                if len(files) > 0:
-                    return files
-
-        if post.url_preview and post.source in self._sources["image"] and len(post.data) <= 1:
-            self._logger.debug("Attempting downloading cashed Reddit image: {post.url_preview}")
-            files = self._download_media(post, post.url_preview, target)
+            except RetryLimitExceededException as e:
+                self._logger.debug(f"Failed to fetch Wayback Machine capture: {e}")
+                continue
             if len(files) > 0:
                 return files
+        return []
 
+    def _download_preview(self, post: Post, target: Path) -> list[Path]:
+        if post.url_preview and post.source in self._sources["image"] and len(post.data) <= 1:
+            self._logger.debug(f"Attempting downloading cached Reddit image: {post.url_preview}")
+            return self._download_media(post, post.url_preview, target)
         return []
 
     def _download_media(self, post: Post, url: str, target: Path) -> list[Path]:
         # Workaround for dead imgur links,
         # because they replace the image with a placeholder image that ultimately gets downloaded otherwise.
-        if self._follow_redirects(url) in ["https://i.imgur.com/removed.png", "https://imgur.com/"]:
+        self._http_client.check(url)
+        if self._follow_redirects(url) in self._removed_placeholders:
             self._logger.debug("Dead Imgur link")
+            self._http_client.dead_links.add(url)
             return []
 
         match self._get_media_type(post, url):
@@ -104,23 +248,44 @@ class Downloader:
 
         return []
 
-    def _get_media_type(self, post: Post, url: str) -> MediaType:
+    def classify(self, post: Post, url: Optional[str] = None) -> MediaType:
+        """ Cheaply determines the media type of the post without any network requests. """
         if post.source in self._sources["video"]:
-            self._logger.debug("Video source detected")
             return MediaType.VIDEO
 
-        if "reddit.com/gallery/" in url:
-            self._logger.debug("Gallery detected")
+        if "reddit.com/gallery/" in (url if url is not None else post.url or ""):
             return MediaType.GALLERY
 
         if post.source in self._sources["image"]:
-            self._logger.debug("Image source detected")
             return MediaType.IMAGE
 
         if post.source and post.source.startswith("self."):
-            self._logger.debug("Text post detected")
             return MediaType.TEXT
 
+        return MediaType.UNKNOWN
+
+    def probe(self, url: str) -> Optional[int]:
+        """
+        Looks up the size of the media at the URL without downloading it, None if it isn't known.
+        Raises DeadLinkException if the media is gone, or RetryLimitExceededException if the lookup fails.
+        """
+        # Not recorded as a dead link, a HEAD request is no proof that a GET of the media would fail too
+        response = self._http_client.head(url, allow_redirects=True, timeout=10, max_tries=1)
+        if response.status_code in (404, 410) or response.url.split("?")[0] in self._removed_placeholders:
+            raise DeadLinkException(f"{url} is gone")
+        if response.status_code != 200 or "content-type" not in response.headers or guess_media_type(response) is MediaType.UNKNOWN:
+            return None
+        return int(response.headers["content-length"]) if "content-length" in response.headers else None
+
+    def _get_media_type(self, post: Post, url: str) -> MediaType:
+        media_type = self.classify(post, url)
+        if media_type is not MediaType.UNKNOWN:
+            self._logger.debug("Detected %s post", media_type.name.lower())
+            return media_type
+
+        return self._guesses.get_or_compute(url, lambda: self._guess_media_type(url)) or MediaType.UNKNOWN
+
+    def _guess_media_type(self, url: str) -> MediaType:
         self._logger.debug("Unknown source, trying to guess post format")
         response = self._http_client.head(url, allow_redirects=True)
         guess = guess_media_type(response)
@@ -130,8 +295,34 @@ class Downloader:
             self._logger.debug("Guessed format as %s", guess.name.lower())
         return guess
 
+    def _shared_download(self, url: str, target: Path, fetch: Callable[[str, Path], Optional[Path]]) -> Optional[Path]:
+        """
+        Downloads the URL only once for all posts linking to it, e.g. reposts, crossposts or the same post of another account.
+        Posts asking for a URL being downloaded wait for that download, then link its file to their own target.
+        """
+        source = self._files.get_or_compute(url, lambda: fetch(url, target))
+        if source is None or ((source.parent, source.stem) == (target.parent, target.stem) and source.exists()):
+            return source
+
+        linked = target.with_suffix(source.suffix)
+        try:
+            link_or_copy(source, linked)
+        except FileNotFoundError:
+            # The file was moved away since, e.g. into a pack
+            source = fetch(url, target)
+            if source is not None:
+                self._files.put(url, source)
+            return source
+        self._logger.debug(f"Reusing already downloaded file {source}: {url}")
+        return linked
+
     def _download_generic_image(self, url: str, target: Path) -> Optional[Path]:
+        return self._shared_download(url, target, self._fetch_image)
+
+    def _fetch_image(self, url: str, target: Path) -> Optional[Path]:
         with self._http_client.get(url, stream=True) as response:
+            if response.status_code in (404, 410):
+                self._http_client.dead_links.add(url)
             if response.status_code != 200:
                 return None
 
@@ -142,58 +333,113 @@ class Downloader:
                 self._logger.warning("Failed to guess extension, using .bin")
                 target = target.with_suffix(".bin")
 
-            with open(target, "wb") as f:
-                for chunk in response.iter_content(chunk_size=1024 * 1024 * 1):  # 1 MB
-                    f.write(chunk)
-
+            # Content-Length is the size on the wire, it only matches the file if the body isn't compressed
+            expected_size = int(response.headers["content-length"]) if "content-length" in response.headers and "content-encoding" not in response.headers else None
+
+            # Written under a temporary name first, so an interrupted download never looks complete
+            partial = target.with_name(target.name + ".part")
+            try:
+                written = self._transfer.write(response.iter_content(chunk_size=self._transfer.chunk_size), partial, expected_size)
+                if expected_size is not None and written != expected_size:
+                    self._logger.debug(f"Incomplete download, got {written} of {expected_size} bytes: {url}")
+                    return None
+                partial.replace(target)
+            finally:
+                partial.unlink(missing_ok=True)
+
+        self._transfer.finish(target)
         return target
 
-    @staticmethod
-    def _download_text(data: list[str], target: Path) -> Path:
+    def _download_text(self, data: list[str], target: Path) -> Path:
         target = target.with_suffix(".md")
         with open(target, "w", encoding="utf-8") as f:
             f.write("\n".join(data))
 
+        self._transfer.finish(target)
         return target
 
-    def _download_video(self, url: str, target: Path, max_tries: int = 3) -> Optional[Path]:
+    def _download_video(self, url: str, target: Path) -> Optional[Path]:
+        return self._shared_download(url, target, self._fetch_video)
+
+    def _fetch_video(self, url: str, target: Path, max_tries: int = 3) -> Optional[Path]:
+        # pylint: disable=import-outside-toplevel
+        # YTDL takes a long time to import, most runs and commands never get to download a video.
+        from yt_dlp import YoutubeDL
+        from yt_dlp.utils import DownloadError
+
+        deadline = Deadline.current()
+        host = urlparse(url).hostname or ""
         with YoutubeDL({
             "outtmpl": f"{target}.%(ext)s",
-            "logger": NullLogger()
+            "logger": NullLogger(),
+            "socket_timeout": deadline.clamp(20),
+            **({"format": self._video_format} if self._video_format is not None else {}),
+            "progress_hooks": [self._progress_hook(deadline)],
         }) as ydl:
             retry_count = 0
+            host_error = False
             while retry_count < max_tries:
                 self._logger.debug("Attempting download using YTDL")
                 try:
-                    status = ydl.download([url])
+                    with self._http_client.slot(host):
+                        status = ydl.download([url])
+                    # The duration of a whole video download says nothing about the latency of the host
+                    self._http_client.host_succeeded(host)
                     if status != 0:
                         self._logger.warning("YTDL exited with non-zero status, but no exception was raised")
 
                     filename = next((file for file in target.parent.iterdir() if file.stem == target.stem and file.suffix != ".json"), None)
                     if filename is None:
                         self._logger.warning("YTDL exited with zero status, but no file was found")
+                    else:
+                        self._transfer.finish(filename)
                     return filename
                 except Exception as e:
+                    # YTDL may wrap the exception raised by the progress hook
+                    deadline.check()
                     if isinstance(e, DownloadError):
                         self._logger.debug(f"YTDL download error: {e.msg}")
                         if e.msg and ("HTTP Error 404" in e.msg or "HTTP Error 410" in e.msg):
                             self._logger.debug("Resource gone, won't retry")
+                            self._http_client.dead_links.add(url)
                             return None
 
                         if e.msg and "Unsupported URL" in e.msg:
                             self._logger.warning("Unsupported URL, won't retry")
                             return None
 
+                        if e.msg and ("HTTP Error 429" in e.msg or "Errno 61" in e.msg or "timed out" in e.msg):
+                            self._http_client.host_overloaded(host)
+                        host_error = bool(e.msg and self._host_errors.search(e.msg))
+
                         retry_count += 1
                         if retry_count < max_tries:
-                            if urlparse(url).hostname == "web.archive.org" and e.msg and 'Errno 61' in e.msg:
+                            if host == "web.archive.org" and e.msg and 'Errno 61' in e.msg:
                                 self._logger.debug("Rate limited, cooling off for a minute")
-                                sleep(61)
+                                deadline.sleep(61)
                         continue
                     raise
 
+        if host_error:
+            self._http_client.host_failed(host)
         return None
 
+    def _progress_hook(self, deadline: Deadline) -> Callable[[dict], None]:
+        """ Returns a YTDL progress hook which holds the download to the bandwidth cap and aborts it once the post runs out of time. """
+        received: dict[str, int] = {}
+
+        def hook(progress: dict) -> None:
+            deadline.check()
+            if progress.get("status") != "downloading":
+                return
+            # Video and audio are downloaded to separate files, each counting up from zero
+            filename = progress.get("filename", "")
+            downloaded = progress.get("downloaded_bytes") or 0
+            self._transfer.throttle(downloaded - received.get(filename, 0))
+            received[filename] = downloaded
+
+        return hook
+
     def _download_album(self, urls: list[str], target: Path) -> list[Path]:
         if len(urls) == 0:
             return []
@@ -212,9 +458,13 @@ class Downloader:
         return files
 
     def _follow_redirects(self, url: str) -> str:
+        return self._redirects.get_or_compute(url, lambda: self._redirect_target(url)) or url
+
+    def _redirect_target(self, url: str) -> Optional[str]:
         try:
             response = self._http_client.head(url, allow_redirects=True, timeout=10, max_tries=1)
             response.raise_for_status()
-            return response.url.split("?")[0]
         except (RetryLimitExceededException, HTTPError):
-            return url
+            # Not cached, the failure may well be temporary
+            return None
+        return response.url.split("?")[0]
@@ -0,0 +1,69 @@
+""" This module contains the Estimate class and the estimate function. """
+
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Iterable, Optional
+
+from grabbit.downloader import Downloader
+from grabbit.httpclient import RetryLimitExceededException, DeadLinkException
+from grabbit.typing_custom import Post, MediaType
+
+
+@dataclass
+class Estimate:
+    """ The expected cost of downloading a set of posts, made without downloading any of them """
+    posts: int = 0
+    media_types: Counter[MediaType] = field(default_factory=Counter)
+    hosts: Counter[str] = field(default_factory=Counter)
+    # Bytes of the media whose size is known, and the number of posts whose size isn't
+    size: int = 0
+    unsized: int = 0
+    # Posts whose original media is gone, most of them will have to come from the Wayback Machine
+    gone: int = 0
+
+
+def estimate(posts: Iterable[Post], downloader: Downloader, probe: bool = False, workers: int = 16) -> Estimate:
+    """
+    Classifies the posts by media type and source host.
+    With probe, the size of direct media is looked up by HEAD requests, sent by several workers at once.
+    """
+    result = Estimate()
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for (post, media_type, size, gone) in executor.map(lambda post: _estimate_post(post, downloader, probe), posts):
+            result.posts += 1
+            result.media_types[media_type] += 1
+            result.hosts[post.source or "unknown"] += 1
+            if size is None:
+                result.unsized += 1
+            else:
+                result.size += size
+            if gone:
+                result.gone += 1
+    return result
+
+
+def _estimate_post(post: Post, downloader: Downloader, probe: bool) -> tuple[Post, MediaType, Optional[int], bool]:
+    media_type = downloader.classify(post)
+    if media_type is MediaType.TEXT:
+        return post, media_type, len("\n".join(post.data).encode("utf-8")), False
+    if post.url is not None and post.url in downloader.dead_links:
+        return post, media_type, None, True
+    if not probe or media_type is MediaType.VIDEO:
+        # Video hosts serve pages, not the media, YTDL would have to resolve them first
+        return post, media_type, None, False
+
+    urls = post.data if media_type is MediaType.GALLERY else [post.url] if post.url is not None else []
+    size: Optional[int] = 0
+    for url in urls:
+        try:
+            item = downloader.probe(url)
+        except DeadLinkException:
+            # A lost gallery item doesn't make the gallery any more likely to be archived
+            if media_type is not MediaType.GALLERY:
+                return post, media_type, None, True
+            item = None
+        except RetryLimitExceededException:
+            item = None
+        size = size + item if size is not None and item is not None else None
+    return post, media_type, size if len(urls) > 0 else None, False
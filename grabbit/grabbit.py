@@ -1,43 +1,92 @@
 """ This module contains the main Grabbit class."""
 
-from json import JSONDecodeError
+from datetime import datetime
+from functools import partial
 from mimetypes import guess_extension
 from pathlib import Path
-from typing import Iterator
+from typing import Callable, Iterable, Iterator, Optional
 from logging import Logger
 import json
+import shutil
 
 from praw.models import Submission
 from praw import Reddit
 from prawcore import OAuthException
 
+from grabbit.budget import ApiBudget, PacedRequestor
 from grabbit.downloader import Downloader
-from grabbit.typing_custom import PostId, Post, RedditUser, PostStatus
-from grabbit.utils import load_gdpr_saved_posts_csv, NullLogger
-
-
+from grabbit.estimate import Estimate, estimate
+from grabbit.index import MetadataIndex
+from grabbit.integrity import describe_file
+from grabbit.listing import saved_listing, info_listing
+from grabbit.pack import Packer, PackIndex
+from grabbit.retry import RetryQueue
+from grabbit.scheduler import Scheduler
+from grabbit.state import State
+from grabbit.typing_custom import Post, PostId, RedditUser, PostStatus, GrabbitConfig, Quality, Durability
+from grabbit.utils import load_gdpr_saved_posts_csv, ensure_post_id, pick_rendition, NullLogger
+
+# The id and subreddit of a saved thing, and how to make a Post of it, None if it isn't a post
+Entry = tuple[PostId, str, Optional[Callable[[], Post]]]
+
+# pylint: disable=too-many-instance-attributes
+# Grabbit ties together the Reddit session, the download machinery and the persisted state of a run,
+# each of those is already its own class and splitting them further would only add indirection.
 class Grabbit:
     """ The main Grabbit class. """
-    _posts: dict[PostId, PostStatus] = {}
+    _posts: State
 
-    _reddit: Reddit
+    _reddit: Optional[Reddit]
+    _username: Optional[str]
+    _raw_listings: bool
+    api_budget: ApiBudget
     _downloader: Downloader
+    _scheduler: Scheduler
+    _retries: RetryQueue
+    _quality: Quality
+    _max_height: Optional[int]
+    _index: Optional[MetadataIndex] = None
+    _metadata_files: bool
+    _pack_size: Optional[int]
+    _sync: bool
+    _packer: Optional[Packer] = None
 
     _wd: Path
+    _state_dir: Path
+    _staging: Optional[Path] = None
     _added_count = 0
-
-    def __init__(self, user: RedditUser, logger: Logger | None):
+    _exited = False
+
+    def __init__(self, user: RedditUser | None, logger: Logger | None, config: GrabbitConfig | None = None, downloader: Downloader | None = None):
+        """
+        Without a user, Grabbit can only download posts it is given, e.g. from a plan.
+        Grabbit instances of several accounts can share a Downloader to reuse its connections, caches and files.
+        """
+        self.api_budget = ApiBudget()
         self._reddit = Reddit(
             user_agent = "Grabbit - Saved Posts Downloader",
             username=user.username,
             password=user.password,
             client_id = user.client_id,
-            client_secret = user.client_secret
-        )
+            client_secret = user.client_secret,
+            requestor_class = PacedRequestor,
+            requestor_kwargs = {"budget": self.api_budget},
+        ) if user is not None else None
+        self._username = user.username if user is not None else None
 
         self._logger = logger if logger else NullLogger()
-
-        self._downloader = Downloader(self._logger)
+        self._posts = State()
+        config = config if config is not None else GrabbitConfig()
+
+        self._downloader = downloader if downloader is not None else Downloader(self._logger, config)
+        self._scheduler = Scheduler(self._downloader.classify, config.queue_budgets, self._logger)
+        self._retries = RetryQueue(config.max_attempts, config.retry_delay)
+        self._quality = config.quality
+        self._max_height = config.max_height
+        self._raw_listings = config.raw_listings
+        self._metadata_files = config.metadata_files
+        self._pack_size = config.pack_size
+        self._sync = config.durability is not Durability.NEVER
 
     def logged_in(self):
         """ Returns True if the user credentials are correct, False otherwise. """
@@ -47,51 +96,150 @@ class Grabbit:
         except OAuthException:
             return False
 
-    def init(self, wd: Path) -> None:
-        """ Initializes the Grabbit instance. """
+    def init(self, wd: Path, state_dir: Path | None = None, dry_run: bool = False) -> None:
+        """
+        Initializes the Grabbit instance.
+        The state is kept in the working directory, unless a separate state directory is given.
+        A dry run only reads the state, it creates no files and can't download anything.
+        """
         self._logger.debug("Initializing Grabbit working directory")
         self._wd = wd
-        self._wd.mkdir(parents=True, exist_ok=True)
+        self._state_dir = state_dir if state_dir is not None else wd
 
         self._logger.debug("Checking for existing data")
         self._load()
+        if dry_run:
+            return
 
-    def exit(self) -> None:
-        """ Saves the current state of the Grabbit instance. """
-        self._save()
-
+        self._wd.mkdir(parents=True, exist_ok=True)
+        self._state_dir.mkdir(parents=True, exist_ok=True)
+        self._index = MetadataIndex(self._state_dir / "index.db")
+
+        if self._pack_size is not None:
+            # Posts are downloaded to the staging directory, then moved into a pack as a whole
+            self._staging = self._state_dir / ".staging"
+            prefix = "pack" if self._state_dir == self._wd else self._state_dir.name
+            self._packer = Packer(self._wd / "packs", PackIndex(self._state_dir / "packs.db", self._wd / "packs"), prefix, self._pack_size)
+
+    def exit(self, save: bool = True) -> None:
+        """
+        Saves the current state of the Grabbit instance, unless told not to, e.g. after a dry run.
+        Only the first call has any effect.
+        """
+        if self._exited:
+            return
+        self._exited = True
+        if save:
+            self._save()
+        if self._index is not None:
+            self._index.close()
+        if self._packer is not None:
+            self._packer.close()
+
+    @property
+    def stopped(self) -> bool:
+        """ Whether stop was called. """
+        return self._scheduler.stopped
+
+    def stop(self) -> None:
+        """
+        Stops downloading, e.g. from a signal handler: no more posts are started and those in flight give up as soon as they can.
+        The download then returns with the posts finished so far recorded, ready to be saved by exit.
+        """
+        self._scheduler.stop()
+        self._downloader.stop()
 
     def download_csv(self, csv_path: Path, skip_failed: bool = False) -> None:
-        """ Downloads the posts specified in the CSV file. """
-        self._download(self._submission_filter(self._reddit.info(fullnames=load_gdpr_saved_posts_csv(csv_path)), skip_failed=skip_failed))
+        """ Downloads the posts specified in the CSV file, then retries previously failed ones. """
+        self._download(self.csv_posts(csv_path))
+        if not skip_failed and not self.stopped:
+            self.download_failed()
 
     def download_saved(self, skip_failed: bool = False) -> None:
-        """ Downloads all Saved Posts. """
-        self._download(self._submission_filter(self._reddit.user.me().saved(limit=None), skip_failed=skip_failed))
-
-
-    def _submission_filter(self, get_next: Iterator, skip_failed: bool) -> Iterator[Post]:
+        """ Downloads all Saved Posts, then retries previously failed ones. """
+        self._download(self.saved_posts())
+        if not skip_failed and not self.stopped:
+            self.download_failed()
+
+    def download_posts(self, posts: Iterable[Post]) -> None:
+        """ Downloads the given posts, e.g. from a plan, skipping those already done and failed ones not yet due. """
+        self._download(post for post in posts if post.id not in self._posts or (self._posts[post.id] == PostStatus.FAILED and self._retries.due([post.id])))
+
+    def csv_posts(self, csv_path: Path) -> Iterator[Post]:
+        """ Returns the posts specified in the CSV file which are yet to be downloaded. """
+        return self._post_filter(self._info(load_gdpr_saved_posts_csv(csv_path)))
+
+    def saved_posts(self) -> Iterator[Post]:
+        """ Returns the Saved Posts which are yet to be downloaded. """
+        if self._raw_listings:
+            return self._post_filter(self._raw_entries(saved_listing(self._reddit, self._username)))
+        return self._post_filter(self._submission_entries(self._reddit.user.me().saved(limit=None)))
+
+    def download_failed(self) -> None:
+        """ Retries previously failed posts whose backoff has expired. """
+        failed = self._failed_ids()
+        due = self._retries.due(failed)
+        self._logger.info("Retrying %d of %d previously failed posts", len(due), len(failed))
+        self._download(self._retry_posts(due))
+
+    def failed_posts(self) -> Iterator[Post]:
+        """ Returns the previously failed posts whose backoff has expired. """
+        return self._retry_posts(self._retries.due(self._failed_ids()))
+
+    def _failed_ids(self) -> list[str]:
+        return [post_id for (post_id, status) in self._posts.items() if status == PostStatus.FAILED]
+
+    def _retry_posts(self, due: list[str]) -> Iterator[Post]:
+        if len(due) == 0:
+            return iter([])
+        return self._post_filter(self._info([ensure_post_id(post_id) for post_id in due]), retry=True)
+
+    def estimate(self, posts: Iterable[Post], probe: bool = False) -> Estimate:
+        """ Estimates the cost of downloading the posts without downloading them, see grabbit.estimate. """
+        return estimate(posts, self._downloader, probe)
+
+
+    def _info(self, fullnames: list[str]) -> Iterator[Entry]:
+        if self._raw_listings:
+            return self._raw_entries(info_listing(self._reddit, fullnames))
+        return self._submission_entries(self._reddit.info(fullnames=fullnames))
+
+    def _submission_entries(self, get_next: Iterator) -> Iterator[Entry]:
         for submission in get_next:
             if not isinstance(submission, Submission):
-                self._logger.info("Skipping %s - not a post", submission.id)
-                self._posts[submission.id] = PostStatus.SKIPPED
+                yield submission.id, "", None
+                continue
+            yield submission.id, submission.subreddit.display_name, partial(self._to_post, submission)
+
+    def _raw_entries(self, things: Iterator[dict]) -> Iterator[Entry]:
+        for thing in things:
+            data = thing["data"]
+            if thing["kind"] != "t3":
+                yield data["id"], "", None
                 continue
+            yield data["id"], data["subreddit"], partial(self._raw_to_post, data)
 
-            if submission.id in self._posts:
-                match self._posts[submission.id]:
+    def _post_filter(self, entries: Iterator[Entry], retry: bool = False) -> Iterator[Post]:
+        for (post_id, sub, to_post) in entries:
+            if to_post is None:
+                self._logger.info("Skipping %s - not a post", post_id)
+                self._posts[post_id] = PostStatus.SKIPPED
+                continue
+
+            if post_id in self._posts:
+                match self._posts[post_id]:
                     case PostStatus.DOWNLOADED:
-                        self._logger.info("Skipping post %s from r/%s - already downloaded", submission.id, submission.subreddit.display_name)
+                        self._logger.info("Skipping post %s from r/%s - already downloaded", post_id, sub)
                         continue
                     case PostStatus.SKIPPED:
-                        self._logger.info("Skipping post %s from r/%s - no valid data to work with", submission.id, submission.subreddit.display_name)
+                        self._logger.info("Skipping post %s from r/%s - no valid data to work with", post_id, sub)
                         continue
-                    case PostStatus.FAILED if skip_failed:
-                        self._logger.info("Skipping post %s from r/%s - previously failed", submission.id, submission.subreddit.display_name)
+                    case PostStatus.FAILED if not retry:
+                        self._logger.info("Skipping post %s from r/%s - previously failed, deferred to the retry pass", post_id, sub)
                         continue
 
-            self._logger.debug("Parsing submission %s from r/%s (https://reddit.com%s)", submission.id, submission.subreddit.display_name, submission.permalink)
-            original_submission = self._fix_crosspost(submission)
-            post = self._to_post(original_submission)
+            self._logger.debug("Parsing submission %s from r/%s", post_id, sub)
+            post = to_post()
 
             self._logger.debug(post)
             if not post.good():
@@ -102,22 +250,25 @@ class Grabbit:
             yield post
 
     def _download(self, get_next: Iterator[Post]) -> None:
-        for post in get_next:
-            self._logger.debug("Attempting to download post %s from r/%s", post.id, post.sub)
-
-            target = self._wd / post.sub
-            target.mkdir(parents=True, exist_ok=True)
-            target = target / post.id
-
-            files = self._downloader.download(post, target)
-            if len(files) == 0:
-                self._logger.info("❌ Failed to download post %s from r/%s", post.id, post.sub)
+        for (post, metadata, error) in self._scheduler.run(get_next, self._download_post):
+            if error is not None:
+                self._logger.warning("Error while downloading post %s from r/%s: %s", post.id, post.sub, error)
+
+            if metadata is None:
+                failure = self._retries.record(post.id, str(error) if error is not None else "no media could be downloaded")
+                if self._retries.parked(post.id):
+                    self._logger.info("❌ Failed to download post %s from r/%s - giving up after %d attempts", post.id, post.sub, failure.attempts)
+                else:
+                    self._logger.info("❌ Failed to download post %s from r/%s - attempt %d, will retry after %s", post.id, post.sub, failure.attempts, datetime.fromtimestamp(failure.next_attempt).strftime("%Y-%m-%d %H:%M"))
                 self._posts[post.id] = PostStatus.FAILED
                 continue
 
-            self._save_metadata(post, files, target)
-
+            if self._packer is not None:
+                self._pack(metadata)
+            if self._index is not None:
+                self._index.add(metadata)
             self._posts[post.id] = PostStatus.DOWNLOADED
+            self._retries.forget(post.id)
 
             self._added_count += 1
             self._logger.info("✅ Downloaded post %s from r/%s", post.id, post.sub)
@@ -127,6 +278,34 @@ class Grabbit:
 
         self._save()
 
+    def _download_post(self, post: Post) -> Optional[dict]:
+        self._logger.debug("Attempting to download post %s from r/%s", post.id, post.sub)
+        target = self._target(post)
+        target.parent.mkdir(parents=True, exist_ok=True)
+        files = self._downloader.download(post, target)
+        if len(files) == 0:
+            return None
+
+        # Done in the worker thread, hashing the files is too slow to hold up the others
+        metadata = self._metadata(post, files, target)
+        if self._metadata_files:
+            self._save_metadata(metadata, target)
+        return metadata
+
+    def _target(self, post: Post) -> Path:
+        return (self._staging if self._staging is not None else self._wd) / post.sub / post.id
+
+    def _pack(self, metadata: dict) -> None:
+        """ Moves the staged files of a downloaded post into the current pack, under the same names as loose files. """
+        staged = self._staging / metadata["sub"]
+        names = [*metadata["files"], *([f"{metadata['id']}.json"] if self._metadata_files else [])]
+        for name in names:
+            self._packer.add(f"{metadata['sub']}/{name}", staged / name)
+        for name in names:
+            (staged / name).unlink()
+        # Albums are downloaded into a directory of their own
+        shutil.rmtree(staged / metadata["id"], ignore_errors=True)
+
     def total_posts(self):
         """ Returns the total number of posts in the database. """
         return len(self._posts)
@@ -136,25 +315,32 @@ class Grabbit:
         return self._added_count
 
     @staticmethod
-    def _save_metadata(post: Post, files: list[Path], target: Path) -> None:
+    def _metadata(post: Post, files: list[Path], target: Path) -> dict:
+        return {
+            "id": post.id,
+            "sub": post.sub,
+            "title": post.title,
+            "author": post.author,
+            "date": post.date,
+            "files": [str(file.relative_to(target.parent)) for file in files],
+            "integrity": {str(file.relative_to(target.parent)): describe_file(file) for file in files},
+        }
+
+    @staticmethod
+    def _save_metadata(metadata: dict, target: Path) -> None:
         with open(target.with_suffix(".json"), "w", encoding="utf-8") as file:
             # noinspection PyTypeChecker
-            json.dump({
-                "id": post.id,
-                "sub": post.sub,
-                "title": post.title,
-                "author": post.author,
-                "date": post.date,
-                "files": [str(file.relative_to(target.parent)) for file in files],
-            }, file, indent=4)
+            json.dump(metadata, file, indent=4)
 
     def _to_post(self, submission: Submission) -> Post:
+        submission = self._fix_crosspost(submission)
         data: list[str] = []
         if submission.is_self:
             data = [submission.selftext]
         elif "reddit.com/gallery/" in submission.url:
-            data = self._process_gallery(submission)
+            data = self._process_gallery(getattr(submission, 'gallery_data', None), getattr(submission, 'media_metadata', None))
 
+        (url_preview, downscaled) = self._process_preview(getattr(submission, 'preview', None))
         return Post(
             submission.id,
             submission.subreddit.display_name,
@@ -162,9 +348,36 @@ class Grabbit:
             submission.author.name if submission.author else "[deleted]",
             submission.created_utc,
             submission.url if submission.url != '' else None,
-            getattr(submission, 'preview', {"images": [{"source": {"url": None}}]})["images"][0]["source"]["url"],
+            url_preview,
             getattr(submission, 'domain', None),
-            data
+            data,
+            downscaled,
+        )
+
+    def _raw_to_post(self, data: dict) -> Post:
+        """ Makes a Post of the raw JSON of a listing, which embeds the original of a crosspost, so it never makes a request. """
+        crossposts = data.get("crosspost_parent_list") or []
+        if len(crossposts) > 0:
+            data = crossposts[-1]
+
+        items: list[str] = []
+        if data.get("is_self"):
+            items = [data.get("selftext", "")]
+        elif "reddit.com/gallery/" in data.get("url", ""):
+            items = self._process_gallery(data.get("gallery_data"), data.get("media_metadata"))
+
+        (url_preview, downscaled) = self._process_preview(data.get("preview"))
+        return Post(
+            data["id"],
+            data["subreddit"],
+            data["title"],
+            data.get("author") or "[deleted]",
+            data["created_utc"],
+            data.get("url") or None,
+            url_preview,
+            data.get("domain"),
+            items,
+            downscaled,
         )
 
     def _fix_crosspost(self, post: Submission) -> Submission:
@@ -173,41 +386,50 @@ class Grabbit:
             return self._reddit.submission(id=crossposts[-1]["id"])
         return post
 
-    def _process_gallery(self, submission: Submission) -> list[str]:
-        try:
-            gallery_data = getattr(submission, 'gallery_data')
-        except AttributeError:
-            return []
-
+    def _process_gallery(self, gallery_data: Optional[dict], media_metadata: Optional[dict]) -> list[str]:
         if gallery_data is None:
             return []
 
         urls = []
         for media_id in [item["media_id"] for item in gallery_data["items"]]:
-            try:
-                img = getattr(submission, "media_metadata")[media_id]
-            except AttributeError:
+            if media_metadata is None or media_id not in media_metadata:
                 self._logger.warning("Media metadata missing for media_id %s", media_id)
                 continue
+            img = media_metadata[media_id]
 
             extension = guess_extension(img["m"], strict=False).removeprefix(".")
             if extension in img["s"]:
+                # Animated, the resized previews are still images
                 url = img["s"][extension]
             else:
-                url = img["s"]["u"]
+                url = pick_rendition((img["s"]["u"], img["s"].get("y", 0)), [(p["u"], p["y"]) for p in img.get("p", [])], self._quality, self._max_height)
             urls.append(url)
 
         return urls
 
+    def _process_preview(self, preview: Optional[dict]) -> tuple[Optional[str], bool]:
+        """ Returns the URL of the preview rendition and whether it is smaller than the original. """
+        if preview is None:
+            return None, False
+        image = preview["images"][0]
+        # The renditions of animated images are still images, their animated renditions are a variant
+        image = image.get("variants", {}).get("gif", image)
+        source = (image["source"]["url"], image["source"].get("height", 0))
+        url = pick_rendition(source, [(r["url"], r["height"]) for r in image.get("resolutions", [])], self._quality, self._max_height)
+        return url, url != source[0]
+
     def _save(self):
-        with open(self._wd / "db.json", "w", encoding="utf-8") as file:
-            # noinspection PyTypeChecker
-            json.dump(self._posts, file, indent=4)
+        # The files first, the state must not refer to files which could still be lost
+        self._downloader.flush()
+        if self._packer is not None:
+            self._packer.commit(sync=self._sync)
+        self._posts.save(self._state_dir / "db.json")
+        if self._index is not None:
+            self._index.commit()
+        self._retries.save(self._state_dir / "retry.json")
+        self._downloader.dead_links.save(self._state_dir / "dead.json")
 
     def _load(self):
-        try:
-            with open(self._wd / "db.json", "r", encoding="utf-8") as file:
-                data = json.load(file)
-                self._posts = dict(data)
-        except (FileNotFoundError, JSONDecodeError):
-            pass
+        self._posts.load(self._state_dir / "db.json")
+        self._retries.load(self._state_dir / "retry.json")
+        self._downloader.dead_links.load(self._state_dir / "dead.json")
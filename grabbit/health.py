@@ -0,0 +1,111 @@
+""" This module contains the CircuitBreaker and DeadLinks classes. """
+
+from json import JSONDecodeError
+from pathlib import Path
+from threading import Lock
+import json
+import time
+
+
+class CircuitBreaker:
+    """
+    Tracks consecutive failures per host.
+    After threshold consecutive failures the circuit of the host opens and stays open for cooldown seconds,
+    after that a single failure opens it again, while a single success closes it.
+    """
+    _threshold: int
+    _cooldown: float
+    _failures: dict[str, int]
+    _opened: dict[str, float]
+    _lock: Lock
+
+    def __init__(self, threshold: int = 5, cooldown: float = 300):
+        self._threshold = threshold
+        self._cooldown = cooldown
+        self._failures = {}
+        self._opened = {}
+        self._lock = Lock()
+
+    def is_open(self, host: str) -> bool:
+        """ Returns True if requests to the host should be short-circuited. """
+        with self._lock:
+            opened = self._opened.get(host)
+            return opened is not None and time.monotonic() - opened < self._cooldown
+
+    def success(self, host: str) -> None:
+        """ Records a successful request to the host. """
+        with self._lock:
+            self._failures.pop(host, None)
+            self._opened.pop(host, None)
+
+    def failure(self, host: str) -> bool:
+        """ Records a failed request to the host, returns True if that opened the circuit. """
+        with self._lock:
+            self._failures[host] = self._failures.get(host, 0) + 1
+            if self._failures[host] >= self._threshold:
+                self._opened[host] = time.monotonic()
+                return True
+            return False
+
+
+class DeadLinks:
+    """
+    A persisted set of URLs known to be gone, so they are not requested again.
+    A URL is forgotten after expiry seconds, in case it was gone only for a while.
+    """
+    _expiry: float
+    _urls: dict[str, float]
+    _lock: Lock
+
+    def __init__(self, expiry: float = 30 * 24 * 60 * 60):
+        self._expiry = expiry
+        self._urls = {}
+        self._lock = Lock()
+
+    def __contains__(self, url: str) -> bool:
+        with self._lock:
+            since = self._urls.get(url)
+            return since is not None and not self._expired(since)
+
+    def __len__(self) -> int:
+        with self._lock:
+            return sum(1 for since in self._urls.values() if not self._expired(since))
+
+    def _expired(self, since: float) -> bool:
+        return time.time() - since >= self._expiry
+
+    def add(self, url: str) -> None:
+        """ Marks the URL as gone. """
+        with self._lock:
+            since = self._urls.get(url)
+            if since is None or self._expired(since):
+                self._urls[url] = time.time()
+
+    def items(self) -> list[tuple[str, float]]:
+        """ Returns the dead links that haven't expired with the time they were found to be gone. """
+        with self._lock:
+            return [(url, since) for (url, since) in self._urls.items() if not self._expired(since)]
+
+    def merge(self, other: "DeadLinks") -> None:
+        """ Adds the dead links of another set to this one. """
+        urls = other.items()
+        with self._lock:
+            for (url, since) in urls:
+                self._urls[url] = max(since, self._urls.get(url, since))
+
+    def save(self, path: Path) -> None:
+        """ Saves the dead links that haven't expired to a JSON file. """
+        urls = dict(self.items())
+        with open(path, "w", encoding="utf-8") as file:
+            # noinspection PyTypeChecker
+            json.dump(urls, file, indent=4)
+
+    def load(self, path: Path) -> None:
+        """ Loads the dead links from a JSON file, if it exists. """
+        try:
+            with open(path, "r", encoding="utf-8") as file:
+                urls = dict(json.load(file))
+        except (FileNotFoundError, JSONDecodeError):
+            return
+        with self._lock:
+            self._urls.update(urls)
@@ -1,42 +1,125 @@
 """ This module contains a wrapper around the "requests" library. """
 
-import time
+from contextlib import AbstractContextManager
 from urllib.parse import urlparse
 from logging import Logger
+import time
 
 import requests
+from requests.adapters import HTTPAdapter
 from requests.models import Response
 
+from grabbit.deadline import Deadline
+from grabbit.health import CircuitBreaker, DeadLinks
+from grabbit.throttle import ConcurrencyLimiter
 from grabbit.utils import NullLogger
 
 class RetryLimitExceededException(Exception):
     """ Raised when the maximum number of retries is exceeded. """
 
+class HostUnavailableException(RetryLimitExceededException):
+    """ Raised when requests to a host are short-circuited because it keeps failing. """
+
+class DeadLinkException(RetryLimitExceededException):
+    """ Raised when the URL is already known to be gone. """
+
 class HTTPClient:
-    """ A wrapper around the requests library that handles retries and backoff. """
+    """
+    A wrapper around the requests library that handles retries and backoff.
+    It also refuses URLs its users found to be gone and stops requesting hosts that keep failing for a while.
+    Connections are pooled and reused by all threads using the client,
+    the number of concurrent requests to each host adapts to how well the host copes with them.
+    """
     _headers: dict[str, str]
     _logger: Logger
     _backoff_factor: float = 0.5
+    _pool_size: int = 32
 
-    def __init__(self, headers: dict | None = None, logger: Logger | None = None):
+    _session: requests.Session
+    _limiter: ConcurrencyLimiter
+
+    _breaker: CircuitBreaker
+    dead_links: DeadLinks
+
+    def __init__(self, headers: dict | None = None, logger: Logger | None = None,
+                 breaker: CircuitBreaker | None = None, dead_links: DeadLinks | None = None):
         self._headers = headers if headers is not None else {}
         self._logger = logger if logger is not None else NullLogger()
+        self._breaker = breaker if breaker is not None else CircuitBreaker()
+        self.dead_links = dead_links if dead_links is not None else DeadLinks()
+
+        self._session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=self._pool_size, pool_maxsize=self._pool_size)
+        self._session.mount("https://", adapter)
+        self._session.mount("http://", adapter)
+        self._limiter = ConcurrencyLimiter(maximum=self._pool_size)
 
     def request(self, method: str, url: str, max_tries: int = 5, timeout: int = 30, **kwargs) -> Response:
-        """ Sends a request to the specified URL. """
+        """
+        Sends a request to the specified URL.
+        The timeout, retries and backoff are bounded by the current Deadline, if there is one.
+        """
+        host = urlparse(url).hostname or ""
+        deadline = Deadline.current()
+        self.check(url)
         retry_count = 0
         while retry_count < max_tries:
             try:
-                return requests.request(method, url, headers=self._headers, timeout=timeout, **kwargs)
+                with self._limiter.slot(host):
+                    started = time.monotonic()
+                    response = self._session.request(method, url, headers=self._headers, timeout=deadline.clamp(timeout), **kwargs)
+                self._record(url, response.status_code, time.monotonic() - started)
+                return response
             except (requests.exceptions.ConnectionError, requests.exceptions.ReadTimeout) as e:
-                if urlparse(url).hostname == "web.archive.org" and 'Errno 61' in str(e):
+                self._limiter.overload(host)
+                if host == "web.archive.org" and 'Errno 61' in str(e):
                     self._logger.debug("Wayback Machine has overheated, cooling off for a minute...")
-                    time.sleep(61)
+                    deadline.sleep(61)
 
             retry_count += 1
-            time.sleep(self._backoff_factor * (2 ** retry_count))
+            if retry_count < max_tries:
+                deadline.sleep(self._backoff_factor * (2 ** retry_count))
+        self.host_failed(host)
         raise RetryLimitExceededException(f"Failed to fetch data from {url} after {max_tries} retries")
 
+    def check(self, url: str) -> None:
+        """ Raises an exception if the URL is known to be gone or its host is unavailable. """
+        if url in self.dead_links:
+            raise DeadLinkException(f"{url} is known to be gone")
+        host = urlparse(url).hostname or ""
+        if self._breaker.is_open(host):
+            raise HostUnavailableException(f"{host} keeps failing, not requesting {url}")
+
+    def host_failed(self, host: str) -> None:
+        """ Records a failed request to the host, e.g. made by another library. """
+        if self._breaker.failure(host):
+            self._logger.warning("%s keeps failing, pausing requests to it for a while", host)
+
+    def slot(self, host: str) -> AbstractContextManager[None]:
+        """ Holds one of the concurrent requests allowed to the host, e.g. for another library. """
+        return self._limiter.slot(host)
+
+    def host_overloaded(self, host: str) -> None:
+        """ Records a sign of the host being overloaded, e.g. seen by another library. """
+        self._limiter.overload(host)
+
+    def host_succeeded(self, host: str, latency: float | None = None) -> None:
+        """
+        Records a successful request to the host, e.g. made by another library.
+        The latency is only given when it is comparable to that of other requests to the host.
+        """
+        self._breaker.success(host)
+        self._limiter.success(host, latency)
+
+    def _record(self, url: str, status_code: int, latency: float) -> None:
+        host = urlparse(url).hostname or ""
+        if status_code in (429, 502, 503, 504):
+            self._limiter.overload(host)
+        if status_code == 429 or status_code >= 500:
+            self.host_failed(host)
+        else:
+            self.host_succeeded(host, latency)
+
     def get(self, url: str, params: dict | None = None, **kwargs) -> Response:
         """ Sends a GET request to the specified URL. """
         return self.request("GET", url, params=params if params is not None else {}, **kwargs)
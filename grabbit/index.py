@@ -0,0 +1,120 @@
+""" This module contains the SQLiteTable and MetadataIndex classes. """
+
+from pathlib import Path
+from typing import Iterator, Optional
+import json
+import os
+import sqlite3
+
+from grabbit.typing_custom import PostId
+
+
+def metadata_files(wd: Path) -> Iterator[Path]:
+    """ Yields the paths of the per-post metadata files in the archive. """
+    with os.scandir(wd) as subs:
+        for sub in subs:
+            if not sub.is_dir():
+                continue
+            with os.scandir(sub.path) as entries:
+                for entry in entries:
+                    if entry.name.endswith(".json") and entry.is_file():
+                        yield Path(entry.path)
+
+
+class SQLiteTable:
+    """ A table kept in its own SQLite database, rows are written out in batches by commit(). """
+    _table: str
+    _connection: sqlite3.Connection
+
+    def __init__(self, path: Path, schema: str):
+        self._connection = sqlite3.connect(path)
+        self._connection.execute(schema)
+        self._connection.commit()
+
+    def __len__(self) -> int:
+        return self._connection.execute(f"SELECT COUNT(*) FROM {self._table}").fetchone()[0]
+
+    def merge(self, path: Path) -> None:
+        """ Adds the rows of another database to this one, replacing existing ones. """
+        self._connection.commit()
+        self._connection.execute("ATTACH DATABASE ? AS other", (str(path),))
+        try:
+            self._connection.execute(f"INSERT OR REPLACE INTO {self._table} SELECT * FROM other.{self._table}")
+            self._connection.commit()
+        finally:
+            self._connection.execute("DETACH DATABASE other")
+
+    def commit(self) -> None:
+        """ Writes the rows added since the last commit to disk. """
+        self._connection.commit()
+
+    def close(self) -> None:
+        """ Commits and closes the database. """
+        self._connection.commit()
+        self._connection.close()
+
+
+class MetadataIndex(SQLiteTable):
+    """
+    A consolidated index of the metadata of every downloaded post, kept in a single SQLite database.
+    Posts are added as they are downloaded and written out in batches by commit().
+    """
+    _table = "posts"
+
+    def __init__(self, path: Path):
+        super().__init__(path, """
+            CREATE TABLE IF NOT EXISTS posts (
+                id TEXT PRIMARY KEY,
+                sub TEXT NOT NULL,
+                title TEXT NOT NULL,
+                author TEXT NOT NULL,
+                date REAL NOT NULL,
+                files TEXT NOT NULL,
+                integrity TEXT NOT NULL,
+                size INTEGER NOT NULL
+            )
+        """)
+        self._connection.execute("CREATE INDEX IF NOT EXISTS posts_sub ON posts (sub)")
+        self._connection.commit()
+
+    def add(self, metadata: dict) -> None:
+        """ Adds or replaces the metadata of a post, as saved in its metadata file. """
+        integrity = metadata.get("integrity", {})
+        self._connection.execute(
+            "INSERT OR REPLACE INTO posts VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (
+                metadata["id"],
+                metadata["sub"],
+                metadata["title"],
+                metadata["author"],
+                metadata["date"],
+                json.dumps(metadata["files"]),
+                json.dumps(integrity),
+                sum(file["size"] for file in integrity.values()),
+            )
+        )
+
+    def get(self, post_id: PostId) -> Optional[dict]:
+        """ Returns the metadata of the post, if it is indexed. """
+        row = self._connection.execute("SELECT * FROM posts WHERE id = ?", (post_id,)).fetchone()
+        return self._to_metadata(row) if row is not None else None
+
+    def __iter__(self) -> Iterator[dict]:
+        for row in self._connection.execute("SELECT * FROM posts ORDER BY sub, id"):
+            yield self._to_metadata(row)
+
+    def __contains__(self, post_id: PostId) -> bool:
+        return self._connection.execute("SELECT 1 FROM posts WHERE id = ?", (post_id,)).fetchone() is not None
+
+    @staticmethod
+    def _to_metadata(row: tuple) -> dict:
+        (post_id, sub, title, author, date, files, integrity, _) = row
+        return {
+            "id": post_id,
+            "sub": sub,
+            "title": title,
+            "author": author,
+            "date": date,
+            "files": json.loads(files),
+            "integrity": json.loads(integrity),
+        }
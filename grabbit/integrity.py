@@ -0,0 +1,43 @@
+""" This module contains helpers for checking the integrity of downloaded files. """
+
+from pathlib import Path
+import hashlib
+
+# Signatures of the file formats Grabbit downloads, as (offset, bytes)
+_MAGIC: dict[str, list[tuple[int, bytes]]] = {
+    ".jpg": [(0, b"\xff\xd8\xff")],
+    ".jpeg": [(0, b"\xff\xd8\xff")],
+    ".png": [(0, b"\x89PNG\r\n\x1a\n")],
+    ".gif": [(0, b"GIF8")],
+    ".webp": [(0, b"RIFF"), (8, b"WEBP")],
+    ".mp4": [(4, b"ftyp")],
+    ".m4v": [(4, b"ftyp")],
+    ".mov": [(4, b"ftyp")],
+    ".webm": [(0, b"\x1a\x45\xdf\xa3")],
+    ".mkv": [(0, b"\x1a\x45\xdf\xa3")],
+}
+
+
+def file_digest(path: Path) -> str:
+    """ Returns the SHA-256 hex digest of the file. """
+    with open(path, "rb") as file:
+        return hashlib.file_digest(file, "sha256").hexdigest()
+
+
+def describe_file(path: Path) -> dict:
+    """ Returns the size and digest of the file, to be recorded in the post metadata. """
+    return {
+        "size": path.stat().st_size,
+        "sha256": file_digest(path),
+    }
+
+
+def has_valid_magic(path: Path) -> bool:
+    """ Returns False if the file doesn't start with the signature its extension calls for. """
+    signatures = _MAGIC.get(path.suffix.lower())
+    if signatures is None:
+        return True
+
+    with open(path, "rb") as file:
+        head = file.read(16)
+    return all(head[offset:offset + len(magic)] == magic for (offset, magic) in signatures)
@@ -0,0 +1,24 @@
+""" This module contains functions reading Reddit listings as raw JSON, without praw models. """
+
+from typing import Iterator
+
+from praw import Reddit
+
+
+def saved_listing(reddit: Reddit, username: str, page_size: int = 100) -> Iterator[dict]:
+    """ Yields the raw things saved by the user, making one API request per page. """
+    after = None
+    while True:
+        params = {"limit": page_size, **({"after": after} if after is not None else {})}
+        listing = reddit.request(method="GET", path=f"user/{username}/saved", params=params)
+        yield from listing["data"]["children"]
+        after = listing["data"]["after"]
+        if after is None:
+            return
+
+
+def info_listing(reddit: Reddit, fullnames: list[str], page_size: int = 100) -> Iterator[dict]:
+    """ Yields the raw things with the given fullnames, making one API request per page. """
+    for start in range(0, len(fullnames), page_size):
+        listing = reddit.request(method="GET", path="api/info", params={"id": ",".join(fullnames[start:start + page_size])})
+        yield from listing["data"]["children"]
@@ -1,11 +1,16 @@
 """ This module contains custom logging classes for Grabbit. """
 
+from __future__ import annotations
+
 import logging
 from copy import copy
 from datetime import datetime
+from typing import TYPE_CHECKING
 import os
 
-from grabbit.grabbit import Grabbit
+if TYPE_CHECKING:
+    # Only needed for annotations, importing Grabbit would pull in praw and YTDL
+    from grabbit.grabbit import Grabbit
 
 
 class GrabbitFormatter(logging.Formatter):
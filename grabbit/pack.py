@@ -0,0 +1,173 @@
+""" This module contains the Packer and PackIndex classes. """
+
+from dataclasses import dataclass
+from fnmatch import fnmatch
+from pathlib import Path
+from typing import BinaryIO, Iterable, Iterator, Optional
+import hashlib
+import os
+import tarfile
+
+from grabbit.index import SQLiteTable
+
+
+@dataclass
+class PackedFile:
+    """ The position of a file in a pack """
+    pack: str
+    offset: int
+    size: int
+
+
+class PackIndex(SQLiteTable):
+    """
+    The position of every packed file, kept in a SQLite database,
+    so any file can be read with a single seek instead of scanning the packs.
+    """
+    _table = "files"
+    _directory: Path
+    _chunk_size: int = 1024 * 1024 * 1 # 1 MB
+
+    def __init__(self, path: Path, directory: Path):
+        """ The index is kept at path, the packs it refers to are in directory. """
+        super().__init__(path, """
+            CREATE TABLE IF NOT EXISTS files (
+                name TEXT PRIMARY KEY,
+                pack TEXT NOT NULL,
+                offset INTEGER NOT NULL,
+                size INTEGER NOT NULL
+            )
+        """)
+        self._directory = directory
+
+    def add(self, name: str, packed: PackedFile) -> None:
+        """ Adds or replaces the position of a file. """
+        self._connection.execute("INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?)", (name, packed.pack, packed.offset, packed.size))
+
+    def get(self, name: str) -> Optional[PackedFile]:
+        """ Returns the position of the file, if it is packed. """
+        row = self._connection.execute("SELECT pack, offset, size FROM files WHERE name = ?", (name,)).fetchone()
+        return PackedFile(*row) if row is not None else None
+
+    def __iter__(self) -> Iterator[tuple[str, PackedFile]]:
+        """ Yields the packed files in the order they are stored, so reading them all is sequential. """
+        for (name, pack, offset, size) in self._connection.execute("SELECT * FROM files ORDER BY pack, offset"):
+            yield name, PackedFile(pack, offset, size)
+
+    def copy(self, packed: PackedFile, target: BinaryIO) -> None:
+        """ Copies the contents of a packed file to the target. """
+        for chunk in self._read(packed):
+            target.write(chunk)
+
+    def intact(self, packed: PackedFile) -> bool:
+        """ Returns False if the pack of the file is missing or truncated. """
+        try:
+            return (self._directory / packed.pack).stat().st_size >= packed.offset + packed.size
+        except FileNotFoundError:
+            return False
+
+    def digest(self, packed: PackedFile) -> str:
+        """ Returns the SHA-256 checksum of a packed file, as integrity.file_digest does for loose files. """
+        sha256 = hashlib.sha256()
+        for chunk in self._read(packed):
+            sha256.update(chunk)
+        return sha256.hexdigest()
+
+    def _read(self, packed: PackedFile) -> Iterator[bytes]:
+        with open(self._directory / packed.pack, "rb") as pack:
+            pack.seek(packed.offset)
+            remaining = packed.size
+            while remaining > 0:
+                chunk = pack.read(min(self._chunk_size, remaining))
+                if not chunk:
+                    raise EOFError(f"{packed.pack} is truncated")
+                yield chunk
+                remaining -= len(chunk)
+
+
+class Packer:
+    """
+    Appends files to tar archives of about max_size bytes ("packs") instead of keeping them as loose files.
+    Packs are written one at a time and strictly sequentially, the positions of the files go to a PackIndex.
+    Each Packer starts a pack of its own, the last pack of an earlier run may have been cut off by a crash.
+    Several writers, e.g. the shards of a plan, can share a directory as long as each has its own prefix.
+    """
+    _directory: Path
+    _prefix: str
+    _max_size: int
+    index: PackIndex
+
+    _tar: Optional[tarfile.TarFile] = None
+    _pack: Optional[Path] = None
+
+    def __init__(self, directory: Path, index: PackIndex, prefix: str = "pack", max_size: int = 1024 * 1024 * 1024):
+        self._directory = directory
+        self._directory.mkdir(parents=True, exist_ok=True)
+        self.index = index
+        self._prefix = prefix
+        self._max_size = max_size
+
+    def add(self, name: str, path: Path) -> None:
+        """ Appends the file at path to the current pack under the given name. """
+        tar = self._current()
+        info = tar.gettarinfo(path, arcname=name)
+        with open(path, "rb") as file:
+            tar.addfile(info, file)
+        # The data ends the member, padded to whole blocks
+        (blocks, remainder) = divmod(info.size, tarfile.BLOCKSIZE)
+        offset = tar.offset - (blocks + (remainder > 0)) * tarfile.BLOCKSIZE
+        self.index.add(name, PackedFile(self._pack.name, offset, info.size))
+
+    def commit(self, sync: bool = False) -> None:
+        """ Writes out the files added so far along with their positions, synced to the disk if asked to. """
+        if self._tar is not None:
+            self._tar.fileobj.flush()
+            if sync:
+                os.fsync(self._tar.fileobj.fileno())
+        self.index.commit()
+
+    def close(self) -> None:
+        """ Finishes the current pack and closes the index. """
+        self._finish()
+        self.index.close()
+
+    def _current(self) -> tarfile.TarFile:
+        if self._tar is not None and self._tar.offset >= self._max_size:
+            self._finish()
+        if self._tar is None:
+            self._pack = self._next_pack()
+            # pylint: disable=consider-using-with
+            # The pack stays open across many posts, until it is full or the Packer is closed.
+            self._tar = tarfile.open(self._pack, "w")
+        return self._tar
+
+    def _finish(self) -> None:
+        if self._tar is not None:
+            self._tar.close()
+            self._tar = None
+
+    def _next_pack(self) -> Path:
+        """ Returns a new pack, numbered after the existing ones. """
+        packs = sorted(self._directory.glob(f"{self._prefix}-*.tar"))
+        number = int(packs[-1].stem.rsplit("-", 1)[1]) + 1 if len(packs) > 0 else 0
+        return self._directory / f"{self._prefix}-{number:05d}.tar"
+
+
+def extract(index: PackIndex, destination: Path, patterns: Iterable[str] = ()) -> int:
+    """
+    Writes the packed files as loose files under destination, in the layout of an unpacked archive.
+    Given glob patterns, e.g. "pics/*", only the matching files are extracted. Returns the number of files written.
+    """
+    patterns = list(patterns)
+    count = 0
+    for (name, packed) in index:
+        if len(patterns) > 0 and not any(fnmatch(name, pattern) for pattern in patterns):
+            continue
+        target = destination / name
+        target.parent.mkdir(parents=True, exist_ok=True)
+        partial = target.with_name(target.name + ".part")
+        with open(partial, "wb") as file:
+            index.copy(packed, file)
+        partial.replace(target)
+        count += 1
+    return count
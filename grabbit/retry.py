@@ -0,0 +1,78 @@
+""" This module contains the RetryQueue class. """
+
+from dataclasses import asdict
+from json import JSONDecodeError
+from pathlib import Path
+from typing import Iterable, Optional
+import json
+import time
+
+from grabbit.typing_custom import PostId, Failure
+
+
+class RetryQueue:
+    """
+    Keeps track of failed posts, how many times they were attempted and when they may be retried.
+    The delay between attempts doubles with every failure, after max_attempts the post is parked for good.
+    """
+    _failures: dict[PostId, Failure]
+    _max_attempts: int
+    _delay: float
+
+    def __init__(self, max_attempts: int = 5, delay: float = 6 * 60 * 60):
+        self._failures = {}
+        self._max_attempts = max_attempts
+        self._delay = delay
+
+    def record(self, post_id: PostId, reason: str, now: Optional[float] = None) -> Failure:
+        """ Records a failed attempt and schedules the next one. """
+        now = now if now is not None else time.time()
+        failure = self._failures.get(post_id)
+        attempts = failure.attempts + 1 if failure is not None else 1
+        self._failures[post_id] = Failure(reason, attempts, now + self._delay * (2 ** (attempts - 1)))
+        return self._failures[post_id]
+
+    def forget(self, post_id: PostId) -> None:
+        """ Removes the post from the queue, e.g. after it was downloaded. """
+        self._failures.pop(post_id, None)
+
+    def get(self, post_id: PostId) -> Optional[Failure]:
+        """ Returns the failure record of the post, if there is one. """
+        return self._failures.get(post_id)
+
+    def items(self) -> Iterable[tuple[PostId, Failure]]:
+        """ Returns the failure records of all posts. """
+        return self._failures.items()
+
+    def parked(self, post_id: PostId) -> bool:
+        """ Returns True if the post ran out of attempts. """
+        failure = self._failures.get(post_id)
+        return failure is not None and failure.attempts >= self._max_attempts
+
+    def due(self, post_ids: Iterable[PostId], now: Optional[float] = None) -> list[PostId]:
+        """ Returns the posts which are eligible for another attempt. """
+        now = now if now is not None else time.time()
+        return [
+            post_id for post_id in post_ids
+            if not self.parked(post_id) and (post_id not in self._failures or self._failures[post_id].next_attempt <= now)
+        ]
+
+    def merge(self, other: "RetryQueue") -> None:
+        """ Folds another queue into this one, keeping the record with more attempts. """
+        for (post_id, failure) in other.items():
+            if post_id not in self._failures or failure.attempts > self._failures[post_id].attempts:
+                self._failures[post_id] = failure
+
+    def save(self, path: Path) -> None:
+        """ Saves the queue to a JSON file. """
+        with open(path, "w", encoding="utf-8") as file:
+            # noinspection PyTypeChecker
+            json.dump({post_id: asdict(failure) for (post_id, failure) in self._failures.items()}, file, indent=4)
+
+    def load(self, path: Path) -> None:
+        """ Loads the queue from a JSON file, if it exists. """
+        try:
+            with open(path, "r", encoding="utf-8") as file:
+                self._failures = {post_id: Failure(**failure) for (post_id, failure) in json.load(file).items()}
+        except (FileNotFoundError, JSONDecodeError):
+            pass
@@ -0,0 +1,122 @@
+""" This module contains the Scheduler class. """
+
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from logging import Logger
+from queue import SimpleQueue
+from threading import Event
+from typing import Callable, Iterable, Iterator, Optional, TypeVar
+
+from grabbit.typing_custom import Post, MediaType
+from grabbit.utils import NullLogger
+
+T = TypeVar("T")
+
+# pylint: disable=too-few-public-methods
+# This is by design. The Scheduler only needs to be told what to run,
+# everything else is an implementation detail of how the queues are drained.
+class Scheduler:
+    """
+    Runs work on posts in separate queues by media type, each with its own concurrency budget,
+    so that cheap posts are never stuck behind slow videos or Wayback crawls.
+    Only a bounded number of posts is read ahead of the queues, so the listing is consumed as the work goes on,
+    except that reading goes on while a queue is idle, so cheap posts are not held up by a backlog of slow ones.
+    """
+    # Posts of unknown type usually end up probing or on the Wayback Machine, so they get a queue of their own too
+    _media_types = [MediaType.TEXT, MediaType.IMAGE, MediaType.GALLERY, MediaType.VIDEO, MediaType.UNKNOWN]
+    # One page of a Reddit listing
+    _read_ahead = 100
+    # Reading on for idle queues stops here, to bound the memory held by a backlog of slow posts
+    _max_backlog = 1000
+
+    _classify: Callable[[Post], MediaType]
+    _budgets: dict[MediaType, int]
+    _logger: Logger
+    _stopped: Event
+
+    def __init__(self, classify: Callable[[Post], MediaType], budgets: dict[MediaType, int], logger: Logger | None = None):
+        self._classify = classify
+        self._budgets = {media_type: max(1, budgets.get(media_type, 1)) for media_type in self._media_types}
+        self._logger = logger if logger is not None else NullLogger()
+        self._stopped = Event()
+
+    @property
+    def stopped(self) -> bool:
+        """ Whether stop was called. """
+        return self._stopped.is_set()
+
+    def stop(self) -> None:
+        """
+        Stops starting work on posts, e.g. from a signal handler.
+        The running work is still waited for, posts it fails on are left out as they were most likely interrupted.
+        """
+        self._stopped.set()
+
+    def run(self, posts: Iterable[Post], work: Callable[[Post], T]) -> Iterator[tuple[Post, Optional[T], Optional[Exception]]]:
+        """
+        Runs work on every post and yields (post, result, exception) as soon as each one finishes.
+        Results are yielded in the calling thread, so the caller does not need to synchronize its state.
+        """
+        executors = {
+            media_type: ThreadPoolExecutor(max_workers=budget, thread_name_prefix=f"grabbit-{media_type.name.lower()}")
+            for (media_type, budget) in self._budgets.items()
+        }
+        backlog: dict[MediaType, deque[Post]] = {media_type: deque() for media_type in self._media_types}
+        running = dict.fromkeys(self._media_types, 0)
+        done: SimpleQueue[tuple[Post, MediaType, Future]] = SimpleQueue()
+        remaining = iter(posts)
+        exhausted = False
+        # Queues of media types missing from the posts are idle for good, they mustn't keep the reading going
+        fed: set[MediaType] = set()
+
+        try:
+            while True:
+                while not exhausted and not self.stopped and self._reading(backlog, running, fed):
+                    post = next(remaining, None)
+                    if post is None:
+                        exhausted = True
+                        break
+                    media_type = self._classify(post)
+                    self._logger.debug("Queueing post %s as %s", post.id, media_type.name.lower())
+                    backlog[media_type].append(post)
+                    fed.add(media_type)
+
+                if self.stopped:
+                    for queue in backlog.values():
+                        queue.clear()
+
+                for (media_type, queue) in backlog.items():
+                    while queue and running[media_type] < self._budgets[media_type]:
+                        post = queue.popleft()
+                        future = executors[media_type].submit(work, post)
+                        future.add_done_callback(lambda f, p=post, t=media_type: done.put((p, t, f)))
+                        running[media_type] += 1
+
+                # Nothing is running only once the backlog is empty and no more posts are to be read
+                if sum(running.values()) == 0:
+                    return
+
+                (post, media_type, future) = done.get()
+                running[media_type] -= 1
+                if self.stopped and future.exception() is not None:
+                    self._logger.debug("Post %s was interrupted", post.id)
+                    continue
+                yield self._unpack(post, future)
+        finally:
+            # Doesn't wait for the running work when the caller is gone, e.g. after an exception
+            for executor in executors.values():
+                executor.shutdown(wait=False, cancel_futures=True)
+
+    def _reading(self, backlog: dict[MediaType, deque[Post]], running: dict[MediaType, int], fed: set[MediaType]) -> bool:
+        """ Whether to read another post: while few are waiting, or while a queue which has been fed posts is idle. """
+        waiting = sum(len(queue) for queue in backlog.values())
+        if waiting >= self._max_backlog:
+            return False
+        return waiting < self._read_ahead or any(running[media_type] + len(backlog[media_type]) < self._budgets[media_type] for media_type in fed)
+
+    @staticmethod
+    def _unpack(post: Post, future: Future) -> tuple[Post, Optional[T], Optional[Exception]]:
+        exception = future.exception()
+        if exception is not None:
+            return post, None, exception
+        return post, future.result(), None
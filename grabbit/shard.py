@@ -0,0 +1,88 @@
+""" This file contains helper functions for splitting the work across multiple machines. """
+
+from contextlib import ExitStack
+from dataclasses import asdict
+from pathlib import Path
+from typing import Iterable, Iterator
+import json
+import zlib
+
+from grabbit.health import DeadLinks
+from grabbit.index import MetadataIndex
+from grabbit.pack import PackIndex
+from grabbit.retry import RetryQueue
+from grabbit.state import State
+from grabbit.typing_custom import Post, PostId, PostStatus
+
+
+def shard_of(post_id: PostId, shards: int) -> int:
+    """ Returns the shard the post belongs to, the same on every machine and run. """
+    return zlib.crc32(post_id.encode("utf-8")) % shards
+
+
+def write_plan(posts: Iterable[Post], directory: Path, shards: int) -> dict[Path, int]:
+    """ Splits the posts into shard manifests, one JSON line per post, returns the number of posts per manifest. """
+    directory.mkdir(parents=True, exist_ok=True)
+    paths = [directory / f"shard-{shard:03d}.jsonl" for shard in range(shards)]
+    counts = dict.fromkeys(paths, 0)
+
+    with ExitStack() as stack:
+        files = [stack.enter_context(open(path, "w", encoding="utf-8")) for path in paths]
+        for post in posts:
+            shard = shard_of(post.id, shards)
+            files[shard].write(json.dumps(asdict(post)) + "\n")
+            counts[paths[shard]] += 1
+
+    return counts
+
+
+def read_plan(path: Path) -> Iterator[Post]:
+    """ Reads the posts of a shard manifest. """
+    with open(path, "r", encoding="utf-8") as file:
+        for line in file:
+            if line.strip():
+                yield Post(**json.loads(line))
+
+
+def merge_shards(state_dir: Path, shard_dirs: Iterable[Path]) -> int:
+    """ Folds the state of shards into the state of the archive, returns the number of shards merged. """
+    state = State()
+    state.load(state_dir / "db.json")
+    retries = RetryQueue()
+    retries.load(state_dir / "retry.json")
+    dead_links = DeadLinks()
+    dead_links.load(state_dir / "dead.json")
+    index = MetadataIndex(state_dir / "index.db")
+
+    count = 0
+    for shard_dir in shard_dirs:
+        shard_state = State()
+        shard_state.load(shard_dir / "db.json")
+        state.merge(shard_state)
+
+        shard_retries = RetryQueue()
+        shard_retries.load(shard_dir / "retry.json")
+        retries.merge(shard_retries)
+
+        shard_dead_links = DeadLinks()
+        shard_dead_links.load(shard_dir / "dead.json")
+        dead_links.merge(shard_dead_links)
+
+        if (shard_dir / "index.db").exists():
+            index.merge(shard_dir / "index.db")
+        if (shard_dir / "packs.db").exists():
+            # All shards write their packs to the same directory, only their positions need merging
+            packs = PackIndex(state_dir / "packs.db", state_dir / "packs")
+            packs.merge(shard_dir / "packs.db")
+            packs.close()
+        count += 1
+
+    for (post_id, status) in state.items():
+        if status != PostStatus.FAILED:
+            retries.forget(post_id)
+
+    state.save(state_dir / "db.json")
+    retries.save(state_dir / "retry.json")
+    dead_links.save(state_dir / "dead.json")
+    index.close()
+    return count
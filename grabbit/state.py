@@ -0,0 +1,34 @@
+""" This module contains the State class. """
+
+from json import JSONDecodeError
+from pathlib import Path
+import json
+
+from grabbit.typing_custom import PostId, PostStatus
+
+
+class State(dict[PostId, PostStatus]):
+    """ The status of every post in the archive, persisted between runs as db.json. """
+    # When merging, the more final status wins
+    _precedence = [PostStatus.SKIPPED, PostStatus.FAILED, PostStatus.DOWNLOADED]
+
+    def merge(self, other: "State") -> None:
+        """ Folds another state into this one, e.g. the state of a shard. """
+        for (post_id, status) in other.items():
+            if post_id not in self or self._precedence.index(status) > self._precedence.index(self[post_id]):
+                self[post_id] = status
+
+    def save(self, path: Path) -> None:
+        """ Saves the state to a JSON file. """
+        with open(path, "w", encoding="utf-8") as file:
+            # noinspection PyTypeChecker
+            json.dump(self, file, indent=4)
+
+    def load(self, path: Path) -> None:
+        """ Loads the state from a JSON file, if it exists. """
+        try:
+            with open(path, "r", encoding="utf-8") as file:
+                data = json.load(file)
+        except (FileNotFoundError, JSONDecodeError):
+            return
+        self.update({post_id: PostStatus(status) for (post_id, status) in data.items()})
@@ -0,0 +1,80 @@
+""" This module contains the ConcurrencyLimiter class. """
+
+from contextlib import contextmanager
+from threading import Condition
+from typing import Iterator, Optional
+import math
+import time
+
+from grabbit.deadline import Deadline
+
+
+class ConcurrencyLimiter:
+    """
+    Limits the number of concurrent requests per host, adapting each limit AIMD-style.
+    The limit grows by one for every limit healthy responses, i.e. by about one per round of requests,
+    and halves on signs of overload: timeouts, refused connections and 429 or 5xx gateway responses.
+    A response only counts as healthy while its latency stays within tolerance times the typical latency of the host.
+    """
+    _initial: float
+    _maximum: float
+    _tolerance: float = 3.0
+    _smoothing: float = 0.2
+
+    _limits: dict[str, float]
+    _in_flight: dict[str, int]
+    _latencies: dict[str, float]
+    _decreased: dict[str, float]
+    _condition: Condition
+
+    def __init__(self, initial: int = 4, maximum: int = 32):
+        self._initial = initial
+        self._maximum = maximum
+        self._limits = {}
+        self._in_flight = {}
+        self._latencies = {}
+        self._decreased = {}
+        self._condition = Condition()
+
+    def limit(self, host: str) -> int:
+        """ Returns the number of concurrent requests currently allowed to the host. """
+        with self._condition:
+            return int(self._limits.get(host, self._initial))
+
+    @contextmanager
+    def slot(self, host: str) -> Iterator[None]:
+        """ Waits until another request to the host is allowed and holds its slot while in the block. """
+        deadline = Deadline.current()
+        with self._condition:
+            while self._in_flight.get(host, 0) >= int(self._limits.get(host, self._initial)):
+                deadline.check()
+                self._condition.wait(timeout=min(1.0, deadline.remaining()))
+            self._in_flight[host] = self._in_flight.get(host, 0) + 1
+        try:
+            yield
+        finally:
+            with self._condition:
+                self._in_flight[host] -= 1
+                self._condition.notify_all()
+
+    def success(self, host: str, latency: Optional[float] = None) -> None:
+        """ Records a healthy response from the host, taking latency seconds if it is comparable to the others. """
+        with self._condition:
+            if latency is not None:
+                typical = self._latencies.get(host, latency)
+                self._latencies[host] = typical + self._smoothing * (latency - typical)
+                if latency > self._tolerance * typical:
+                    return
+            limit = self._limits.get(host, self._initial)
+            self._limits[host] = min(self._maximum, limit + 1 / limit)
+            self._condition.notify_all()
+
+    def overload(self, host: str) -> None:
+        """ Records a sign of the host being overloaded. """
+        with self._condition:
+            now = time.monotonic()
+            # The requests in flight when the host got overloaded tend to fail together, that is a single signal
+            if now - self._decreased.get(host, -math.inf) < self._latencies.get(host, 1.0):
+                return
+            self._decreased[host] = now
+            self._limits[host] = max(1.0, self._limits.get(host, self._initial) / 2)
@@ -0,0 +1,110 @@
+""" This module contains the Transfer class. """
+
+from pathlib import Path
+from threading import Lock
+from typing import Iterable, Optional
+import os
+import time
+
+from grabbit.deadline import Deadline
+from grabbit.typing_custom import Durability
+
+
+class Transfer:
+    """
+    The path of downloaded bytes to the disk, shared by all downloads of the process.
+    Caps the bandwidth of all transfers together at rate bytes per second: every chunk received
+    books the time it takes at that rate, in the order the chunks arrive, so concurrent transfers share it fairly.
+    Files of known size are preallocated, and made durable according to the Durability.
+    """
+    _rate: Optional[float]
+    _buffer_size: int
+    _durability: Durability
+    # The time by which every byte received so far would have been received at the capped rate
+    _booked: float = 0
+    _pending: list[Path]
+    _lock: Lock
+
+    def __init__(self, rate: Optional[float] = None, buffer_size: int = 1024 * 1024, durability: Durability = Durability.NEVER):
+        self._rate = rate
+        self._buffer_size = buffer_size
+        self._durability = durability
+        self._pending = []
+        self._lock = Lock()
+
+    @property
+    def chunk_size(self) -> int:
+        """ The size of the chunks to read, small enough for a capped rate to be shared in turns of about 1/8 s. """
+        if self._rate is None:
+            return self._buffer_size
+        return max(16 * 1024, min(self._buffer_size, int(self._rate / 8)))
+
+    def throttle(self, size: int) -> None:
+        """ Waits until receiving size more bytes fits in the bandwidth cap, bounded by the current Deadline. """
+        if self._rate is None or size <= 0:
+            return
+        with self._lock:
+            now = time.monotonic()
+            self._booked = max(self._booked, now) + size / self._rate
+            delay = self._booked - now
+        Deadline.current().sleep(delay)
+
+    def write(self, chunks: Iterable[bytes], path: Path, size: Optional[int] = None) -> int:
+        """
+        Writes the chunks to the file, at the capped rate, and returns the number of bytes written.
+        The file is preallocated if its size is known, so it is less likely to end up fragmented or to run out of space midway.
+        """
+        deadline = Deadline.current()
+        written = 0
+        with open(path, "wb", buffering=self._buffer_size) as file:
+            if size is not None and size > 0 and hasattr(os, "posix_fallocate"):
+                try:
+                    os.posix_fallocate(file.fileno(), 0, size)
+                except OSError:
+                    # Not supported by every file system, it's only an optimization
+                    pass
+            for chunk in chunks:
+                deadline.check()
+                written += file.write(chunk)
+                self.throttle(len(chunk))
+            if size is not None and written < size:
+                file.truncate(written)
+        return written
+
+    def finish(self, path: Path) -> None:
+        """ Makes a completely written file durable, right away or with the next flush(), depending on the Durability. """
+        match self._durability:
+            case Durability.FILE:
+                self._sync(path)
+                self._sync_directory(path.parent)
+            case Durability.BATCH:
+                with self._lock:
+                    self._pending.append(path)
+
+    def flush(self) -> None:
+        """ Makes the files finished since the last flush durable, when they are synced in batches. """
+        with self._lock:
+            (pending, self._pending) = (self._pending, [])
+        for path in pending:
+            self._sync(path)
+        for directory in {path.parent for path in pending}:
+            self._sync_directory(directory)
+
+    @staticmethod
+    def _sync_directory(path: Path) -> None:
+        # Windows can't open directories, NTFS journals their entries on its own
+        if os.name != "nt":
+            Transfer._sync(path)
+
+    @staticmethod
+    def _sync(path: Path) -> None:
+        try:
+            # Windows only syncs files opened for writing
+            fd = os.open(path, os.O_RDWR if os.name == "nt" else os.O_RDONLY)
+        except FileNotFoundError:
+            # Already moved on, e.g. into a pack
+            return
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
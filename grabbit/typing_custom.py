@@ -1,6 +1,7 @@
 """ This module contains custom types used in the Grabbit package. """
 
 from dataclasses import dataclass, field
+from pathlib import Path
 from typing import Optional
 from enum import Enum
 
@@ -21,6 +22,8 @@ class Post:
     url_preview: Optional[str] = None
     source: Optional[str] = None
     data: list[str] = field(default_factory=list)
+    # The preview is a rendition smaller than the original, picked for --quality or --max-height
+    downscaled: bool = False
 
     def good(self):
         """ Returns True if the post is good, False otherwise. """
@@ -38,6 +41,20 @@ class MediaType(Enum):
     UNKNOWN = 5
 
 
+class LadderStep(str, Enum):
+    """ Represents a place the media of a post can be downloaded from """
+    ORIGINAL = "original"
+    REDIRECT = "redirect"
+    WAYBACK = "wayback"
+    PREVIEW = "preview"
+
+
+class Quality(str, Enum):
+    """ Represents which renditions of images are downloaded """
+    FULL = "full"
+    PREVIEW = "preview"
+
+
 @dataclass
 class RedditUser:
     """ Represents a Reddit user """
@@ -47,8 +64,62 @@ class RedditUser:
     client_secret: str
 
 
+class Durability(str, Enum):
+    """ Represents when downloaded files are synced to the disk """
+    FILE = "file"
+    BATCH = "batch"
+    NEVER = "never"
+
+
+@dataclass
+class Account:
+    """ Represents one of the accounts downloaded together by the accounts command """
+    user_config: Path
+    output_dir: Path
+    csv: Optional[Path] = None
+
+
 class PostStatus(str, Enum):
     """ Represents the status of a post """
     DOWNLOADED = "downloaded"
     SKIPPED = "skipped"
     FAILED = "failed"
+
+
+@dataclass
+class Failure:
+    """ Represents the failed download attempts of a post """
+    reason: str
+    attempts: int
+    next_attempt: float
+
+
+@dataclass
+class GrabbitConfig:
+    """ Represents the tunable settings of a Grabbit run """
+    max_attempts: int = 5
+    retry_delay: float = 6 * 60 * 60
+    post_timeout: Optional[float] = None
+    ladder: list[LadderStep] = field(default_factory=lambda: list(LadderStep))
+    breaker_threshold: int = 5
+    breaker_cooldown: float = 5 * 60
+    quality: Quality = Quality.FULL
+    max_height: Optional[int] = None
+    # Seconds the original image has to arrive in while the preview is downloaded alongside, None to never race them
+    race_preview: Optional[float] = None
+    metadata_files: bool = True
+    # Bytes per pack when packing posts into tar archives, None to keep loose files
+    pack_size: Optional[int] = None
+    # Bytes per second of all downloads together, None for no cap
+    bandwidth: Optional[float] = None
+    write_buffer: int = 1024 * 1024
+    durability: Durability = Durability.NEVER
+    # Build posts straight from the JSON of listings instead of praw models
+    raw_listings: bool = False
+    queue_budgets: dict[MediaType, int] = field(default_factory=lambda: {
+        MediaType.TEXT: 4,
+        MediaType.IMAGE: 8,
+        MediaType.GALLERY: 4,
+        MediaType.VIDEO: 2,
+        MediaType.UNKNOWN: 2,
+    })
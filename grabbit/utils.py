@@ -1,16 +1,23 @@
 """ This file contains helper functions for the grabbit package. """
 
+from __future__ import annotations
+
 import csv
+import os
+import shutil
 from mimetypes import guess_extension
 from pathlib import Path
-from typing import Optional
+from typing import Optional, TYPE_CHECKING
 from logging import Logger
 import tomllib
+import importlib.metadata
 import importlib.util
 
-from requests.models import Response
+from grabbit.typing_custom import MediaType, PostId, Quality
 
-from grabbit.typing_custom import MediaType, PostId
+if TYPE_CHECKING:
+    # Only needed for annotations, importing requests would slow down the start of the CLI
+    from requests.models import Response
 
 
 def guess_media_type(response: Response) -> MediaType:
@@ -28,6 +35,37 @@ def guess_media_extension(response: Response) -> Optional[str]:
     return guess_extension(response.headers["content-type"].split(";")[0].strip(), strict=False)
 
 
+def pick_rendition(source: tuple[str, int], resolutions: list[tuple[str, int]], quality: Quality, max_height: Optional[int]) -> str:
+    """
+    Picks the URL of an image rendition out of the full size source and its resized previews, given as (url, height).
+    The tallest rendition no taller than max_height wins, or the shortest one if they are all taller.
+    With the preview quality the full size source is only used if there are no resized previews.
+    """
+    if len(resolutions) == 0:
+        return source[0]
+
+    candidates = sorted(resolutions if quality is Quality.PREVIEW else [*resolutions, source], key=lambda rendition: rendition[1])
+    fitting = [rendition for rendition in candidates if max_height is None or rendition[1] <= max_height]
+    return fitting[-1][0] if len(fitting) > 0 else candidates[0][0]
+
+
+def link_or_copy(source: Path, target: Path) -> None:
+    """ Hard links the source file to the target, copying it where linking isn't possible, e.g. across file systems. """
+    target.unlink(missing_ok=True)
+    try:
+        os.link(source, target)
+    except OSError:
+        shutil.copy2(source, target)
+
+def format_size(size: int) -> str:
+    """ Formats a number of bytes for humans, e.g. 1.5 GB """
+    value = float(size)
+    for unit in ["B", "KB", "MB", "GB"]:
+        if value < 1024:
+            return f"{value:.1f} {unit}" if unit != "B" else f"{size} B"
+        value /= 1024
+    return f"{value:.1f} TB"
+
 def load_gdpr_saved_posts_csv(path: Path) -> list[PostId]:
     """ Loads post ids from the GDPR Saved Posts CSV file """
     with open(path, encoding="utf-8") as file:
@@ -82,7 +120,12 @@ def find_pyproject_from_module(module_name: str) -> Path:
     raise FileNotFoundError("pyproject.toml not found")
 
 def get_version() -> str:
-    """ Returns the current version. """
+    """ Returns the current version, from the installed package metadata or pyproject.toml of a source checkout. """
+    try:
+        return importlib.metadata.version('grabbit')
+    except importlib.metadata.PackageNotFoundError:
+        pass
+
     with open(find_pyproject_from_module('grabbit'), 'rb') as f:
         # noinspection PyTypeChecker
         pyproject_data = tomllib.load(f)
@@ -0,0 +1,128 @@
+""" This module contains the Verifier class. """
+
+from concurrent.futures import ThreadPoolExecutor
+from itertools import chain
+from json import JSONDecodeError
+from logging import Logger
+from pathlib import Path
+from typing import Optional
+import json
+
+from grabbit.index import MetadataIndex, metadata_files
+from grabbit.integrity import file_digest, has_valid_magic
+from grabbit.pack import PackIndex, PackedFile
+from grabbit.state import State
+from grabbit.typing_custom import PostId, PostStatus
+from grabbit.utils import NullLogger
+
+
+# pylint: disable=too-few-public-methods
+# This is by design. While it potentially could be a single function,
+# Verifier being a class allows it to hold its settings, making the usage more concise.
+class Verifier:
+    """
+    Checks that the files of downloaded posts exist and are complete.
+    Files are checked against the size recorded in the post metadata using only stat,
+    full hashes are only compared on request. Files without a recorded size have their signature checked instead.
+    """
+    _wd: Path
+    _logger: Logger
+    _workers: int
+    _hash_files: bool
+    _packs: Optional[PackIndex]
+    _packed: dict[str, PackedFile]
+
+    def __init__(self, wd: Path, logger: Logger | None = None, workers: int = 16, hash_files: bool = False):
+        self._wd = wd
+        self._logger = logger if logger is not None else NullLogger()
+        self._workers = workers
+        self._hash_files = hash_files
+        self._packs = None
+        self._packed = {}
+
+    def verify(self, state: State, index: Optional[MetadataIndex] = None, packs: Optional[PackIndex] = None) -> dict[PostId, str]:
+        """
+        Returns the downloaded posts which are broken, with the reason.
+        Metadata is taken from the index where possible, the metadata files are only read for posts missing from it.
+        Files which aren't loose are looked up in the packs, if there are any.
+        """
+        broken: dict[PostId, str] = {}
+        seen: set[PostId] = set()
+        # Read up front, the database can't be used by the worker threads
+        self._packs = packs
+        self._packed = dict(packs) if packs is not None else {}
+
+        indexed = [(self._wd / metadata["sub"], metadata) for metadata in index] if index is not None else []
+        indexed_ids = {metadata["id"] for (_, metadata) in indexed}
+        unindexed = (path for path in metadata_files(self._wd) if path.stem not in indexed_ids)
+
+        with ThreadPoolExecutor(max_workers=self._workers) as executor:
+            results = chain(
+                executor.map(lambda entry: self._verify_metadata(*entry), indexed, chunksize=64),
+                executor.map(self._verify_post, unindexed, chunksize=64),
+            )
+            for (post_id, problem) in results:
+                seen.add(post_id)
+                if problem is not None and state.get(post_id) == PostStatus.DOWNLOADED:
+                    broken[post_id] = problem
+
+        for (post_id, status) in state.items():
+            if status == PostStatus.DOWNLOADED and post_id not in seen:
+                broken[post_id] = "metadata missing"
+
+        self._logger.info("Verified %d posts, %d broken", len(seen), len(broken))
+        return broken
+
+    def _verify_post(self, metadata_path: Path) -> tuple[PostId, Optional[str]]:
+        post_id = metadata_path.stem
+        try:
+            with open(metadata_path, "r", encoding="utf-8") as file:
+                metadata = json.load(file)
+        except (OSError, JSONDecodeError):
+            return post_id, "metadata unreadable"
+        metadata.setdefault("id", post_id)
+        return self._verify_metadata(metadata_path.parent, metadata)
+
+    def _verify_metadata(self, directory: Path, metadata: dict) -> tuple[PostId, Optional[str]]:
+        integrity = metadata.get("integrity", {})
+        for name in metadata.get("files", []):
+            problem = self._verify_file(directory / name, integrity.get(name))
+            if problem is not None:
+                return metadata["id"], f"{name}: {problem}"
+        return metadata["id"], None
+
+    def _verify_file(self, path: Path, expected: Optional[dict]) -> Optional[str]:
+        try:
+            size = path.stat().st_size
+        except FileNotFoundError:
+            packed = self._packed.get(path.relative_to(self._wd).as_posix())
+            return self._verify_packed_file(packed, expected) if packed is not None else "missing"
+
+        if expected is None:
+            return self._verify_legacy_file(path, size)
+
+        if size != expected["size"]:
+            return f"size {size} instead of {expected['size']}"
+        if self._hash_files and file_digest(path) != expected["sha256"]:
+            return "checksum mismatch"
+        return None
+
+    def _verify_packed_file(self, packed: PackedFile, expected: Optional[dict]) -> Optional[str]:
+        if not self._packs.intact(packed):
+            return f"pack {packed.pack} is missing or truncated"
+        if expected is None:
+            return "empty" if packed.size == 0 else None
+        if packed.size != expected["size"]:
+            return f"size {packed.size} instead of {expected['size']}"
+        if self._hash_files and self._packs.digest(packed) != expected["sha256"]:
+            return "checksum mismatch"
+        return None
+
+    @staticmethod
+    def _verify_legacy_file(path: Path, size: int) -> Optional[str]:
+        # Downloaded before sizes were recorded, the best that can be done is to look at the file
+        if size == 0:
+            return "empty"
+        if not has_valid_magic(path):
+            return "not a valid file of its type"
+        return None
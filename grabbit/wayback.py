@@ -4,6 +4,7 @@ import re
 
 from requests.models import Response
 
+from grabbit.cache import Cache
 from grabbit.utils import guess_media_type
 from grabbit.typing_custom import MediaType
 from grabbit.httpclient import HTTPClient
@@ -62,13 +63,16 @@ class Wayback:
     _src_url: str = "https://web.archive.org/web"
 
     _http_client: HTTPClient
+    _captures: Cache[str, list[str]]
 
     def __init__(self, http_client: HTTPClient):
         self._http_client = http_client
+        self._captures = Cache()
 
     def get(self, url: str) -> WaybackList:
-        """ Returns a list of Wayback URLs for the specified URL. """
-        return WaybackList(self._http_client, self._get_urls(url))
+        """ Returns a list of Wayback URLs for the specified URL, looking up each URL only once. """
+        urls = self._captures.get_or_compute(url, lambda: self._get_urls(url))
+        return WaybackList(self._http_client, list(urls or []))
 
     def _get_urls(self, url: str) -> list[str]:
         params = {
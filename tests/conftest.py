@@ -0,0 +1,17 @@
+""" Fixtures shared by the tests """
+
+from typing import Callable, Optional
+
+import pytest
+
+from grabbit.typing_custom import Post
+
+PostFactory = Callable[..., Post]
+
+@pytest.fixture(name="make_post")
+def fixture_make_post() -> PostFactory:
+    """ Fixture of a factory of posts, from i.redd.it unless told otherwise """
+    def make_post(post_id: str, source: str = "i.redd.it", url: Optional[str] = None, **fields) -> Post:
+        return Post(id=post_id, sub="test", title="Test Post", author="author", date=1234567890,
+                    url=url or f"https://{source}/{post_id}.jpg", source=source, **fields)
+    return make_post
@@ -0,0 +1,51 @@
+""" Tests for the ApiBudget and PacedRequestor classes """
+
+import time
+
+import pytest
+from flexmock import flexmock
+from prawcore import Requestor
+from requests.models import Response
+
+from grabbit.budget import ApiBudget, PacedRequestor
+
+def test_no_headers():
+    """ Tests that requests aren't paced before the rate limit is known """
+    flexmock(time).should_receive("sleep").never()
+    budget = ApiBudget()
+    budget.update({})
+    budget.wait()
+    assert budget.calls == 1
+    assert budget.remaining is None
+
+def test_spreads_budget():
+    """ Tests that the remaining budget is spread evenly over the rest of the window """
+    delays = []
+    flexmock(time).should_receive("sleep").replace_with(delays.append)
+    budget = ApiBudget()
+    budget.update({"x-ratelimit-remaining": "100.0", "x-ratelimit-reset": "50", "x-ratelimit-used": "500"})
+    budget.wait()
+    assert budget.remaining == 100
+    assert delays[0] == pytest.approx(0.5, abs=0.05)
+
+def test_exhausted_budget():
+    """ Tests that an exhausted budget waits for the window to reset """
+    delays = []
+    flexmock(time).should_receive("sleep").replace_with(delays.append)
+    budget = ApiBudget()
+    budget.update({"x-ratelimit-remaining": "0", "x-ratelimit-reset": "30"})
+    budget.wait()
+    assert delays[0] == pytest.approx(30, abs=0.1)
+
+def test_requestor():
+    """ Tests that the requestor counts requests and reads the rate limit of their responses """
+    response = Response()
+    response.status_code = 200
+    response.headers.update({"x-ratelimit-remaining": "599", "x-ratelimit-reset": "600"})
+    flexmock(Requestor).should_receive("request").and_return(response).once()
+
+    budget = ApiBudget()
+    requestor = PacedRequestor(user_agent="Grabbit - Saved Posts Downloader", budget=budget)
+    assert requestor.request("GET", "https://oauth.reddit.com/api/v1/me") is response
+    assert budget.calls == 1
+    assert budget.remaining == 599
@@ -0,0 +1,114 @@
+""" Tests for the Cache class and the caches of the Downloader """
+
+import json
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from threading import Event
+
+from flexmock import flexmock
+from requests.models import Response
+
+from grabbit.cache import Cache
+from grabbit.cli import load_accounts
+from grabbit.downloader import Downloader
+from grabbit.httpclient import HTTPClient
+from grabbit.typing_custom import Post
+from grabbit.utils import NullLogger
+
+def test_cache():
+    """ Tests storing and looking up values """
+    cache: Cache[str, int] = Cache()
+    assert cache.get("a") is None
+    cache.put("a", 1)
+    assert cache.get("a") == 1
+    assert len(cache) == 1
+
+def test_single_flight():
+    """ Tests that concurrent callers wait for the value being computed instead of computing it again """
+    cache: Cache[str, int] = Cache()
+    started, release = Event(), Event()
+    calls = []
+
+    def compute() -> int:
+        calls.append(1)
+        started.set()
+        release.wait(timeout=5)
+        return 1
+
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        first = executor.submit(cache.get_or_compute, "a", compute)
+        started.wait(timeout=5)
+        second = executor.submit(cache.get_or_compute, "a", compute)
+        release.set()
+        assert (first.result(), second.result()) == (1, 1)
+    assert len(calls) == 1
+
+def test_failures_not_cached():
+    """ Tests that a failed computation is attempted again """
+    cache: Cache[str, int] = Cache()
+    assert cache.get_or_compute("a", lambda: None) is None
+    assert cache.get_or_compute("a", lambda: 2) == 2
+    assert cache.get_or_compute("a", lambda: 3) == 2
+
+def _image_response() -> Response:
+    response = Response()
+    response.status_code = 200
+    response.headers["content-type"] = "image/jpeg"
+    response.headers["content-length"] = "4"
+    response.raw = flexmock(stream=lambda *_args, **_kwargs: iter([b"\xff\xd8\xff\xe0"]), release_conn=lambda: None)
+    return response
+
+def test_shared_downloads(tmp_path: Path):
+    """ Tests that media saved by two accounts is downloaded once and linked to the second """
+    url = "https://i.redd.it/a.jpg"
+    post = Post(id="a", sub="test", title="Test Post", author="author", date=1234567890, url=url, source="i.redd.it")
+    flexmock(Downloader).should_receive("_follow_redirects").and_return(url)
+    flexmock(HTTPClient).should_receive("get").and_return(_image_response()).once()
+
+    downloader = Downloader(NullLogger())
+    (tmp_path / "first").mkdir()
+    (tmp_path / "second").mkdir()
+    assert downloader.download(post, tmp_path / "first" / "a") == [tmp_path / "first" / "a.jpg"]
+    assert downloader.download(post, tmp_path / "second" / "a") == [tmp_path / "second" / "a.jpg"]
+    assert (tmp_path / "second" / "a.jpg").read_bytes() == b"\xff\xd8\xff\xe0"
+
+def test_concurrent_shared_downloads(tmp_path: Path):
+    """ Tests that posts downloading the same media at the same time share a single download """
+    url = "https://i.redd.it/a.jpg"
+    posts = [Post(id=post_id, sub="test", title="Test Post", author="author", date=1234567890, url=url, source="i.redd.it") for post_id in "ab"]
+    flexmock(Downloader).should_receive("_follow_redirects").and_return(url)
+    flexmock(HTTPClient).should_receive("get").and_return(_image_response()).once()
+
+    downloader = Downloader(NullLogger())
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        files = list(executor.map(lambda post: downloader.download(post, tmp_path / post.id), posts))
+    assert sorted(files) == [[tmp_path / "a.jpg"], [tmp_path / "b.jpg"]]
+    assert (tmp_path / "b.jpg").read_bytes() == b"\xff\xd8\xff\xe0"
+
+def test_moved_shared_download(tmp_path: Path):
+    """ Tests that media is downloaded again once its earlier file is gone, e.g. into a pack """
+    url = "https://i.redd.it/a.jpg"
+    post = Post(id="a", sub="test", title="Test Post", author="author", date=1234567890, url=url, source="i.redd.it")
+    flexmock(Downloader).should_receive("_follow_redirects").and_return(url)
+    flexmock(HTTPClient).should_receive("get").replace_with(lambda *_args, **_kwargs: _image_response()).twice()
+
+    downloader = Downloader(NullLogger())
+    (tmp_path / "first").mkdir()
+    (tmp_path / "second").mkdir()
+    assert downloader.download(post, tmp_path / "first" / "a") == [tmp_path / "first" / "a.jpg"]
+    (tmp_path / "first" / "a.jpg").unlink()
+    assert downloader.download(post, tmp_path / "second" / "a") == [tmp_path / "second" / "a.jpg"]
+    assert (tmp_path / "second" / "a.jpg").exists()
+
+def test_load_accounts(tmp_path: Path):
+    """ Tests that the paths of the accounts are relative to the accounts file """
+    with open(tmp_path / "accounts.json", "w", encoding="utf-8") as file:
+        json.dump([
+            {"user_config": "alice.json", "output_dir": "alice"},
+            {"user_config": "bob.json", "output_dir": "bob", "csv": "saved_posts.csv"},
+        ], file)
+
+    accounts = load_accounts(tmp_path / "accounts.json")
+    assert [account.output_dir for account in accounts] == [tmp_path / "alice", tmp_path / "bob"]
+    assert accounts[0].csv is None
+    assert accounts[1].csv == tmp_path / "saved_posts.csv"
@@ -1,5 +1,8 @@
 """ Tests of the CLI """
 
+import subprocess
+import sys
+
 from click.testing import CliRunner
 from grabbit.cli import cli
 from grabbit.utils import get_version
@@ -11,3 +14,17 @@ def test_version():
     result = runner.invoke(cli, ['--version'])
     assert result.exit_code == 0
     assert result.output == get_version() + '\n'
+
+def test_startup_imports():
+    """ Guards the start time of the CLI by making sure the heavy dependencies are only imported when needed """
+    heavy = ["praw", "prawcore", "yt_dlp", "requests", "grabbit.grabbit", "grabbit.downloader"]
+    code = f"""
+import sys
+from click.testing import CliRunner
+from grabbit.cli import cli
+CliRunner().invoke(cli, ['--help'])
+CliRunner().invoke(cli, ['--version'])
+print(','.join(module for module in {heavy!r} if module in sys.modules))
+"""
+    result = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True)
+    assert result.stdout.strip() == ""
@@ -0,0 +1,61 @@
+""" Tests for the Deadline class """
+
+import time
+from threading import Event, Timer
+
+import pytest
+import requests
+from flexmock import flexmock
+
+from grabbit.deadline import Deadline, DeadlineExceededException
+from grabbit.httpclient import HTTPClient
+
+def test_unlimited_by_default():
+    """ Tests that there is no limit outside a deadline """
+    deadline = Deadline.current()
+    assert deadline.clamp(30) == 30
+    deadline.check()
+
+def test_current():
+    """ Tests that entering a deadline makes it the current one """
+    with Deadline(10) as deadline:
+        assert Deadline.current() is deadline
+        assert deadline.clamp(30) <= 10
+    assert Deadline.current() is not deadline
+
+def test_expired():
+    """ Tests that an expired deadline raises """
+    with Deadline(0) as deadline:
+        with pytest.raises(DeadlineExceededException):
+            deadline.check()
+        with pytest.raises(DeadlineExceededException):
+            deadline.clamp(30)
+
+def test_sleep_past_deadline():
+    """ Tests that sleeping past the deadline raises right away """
+    flexmock(time).should_receive('sleep').never()
+    with Deadline(10) as deadline:
+        with pytest.raises(DeadlineExceededException):
+            deadline.sleep(61)
+
+def test_stop():
+    """ Tests that setting the stop event ends the deadline, also cutting a sleep short """
+    stop = Event()
+    with Deadline(60, stop) as deadline:
+        deadline.check()
+        Timer(0.05, stop.set).start()
+        started = time.monotonic()
+        with pytest.raises(DeadlineExceededException):
+            deadline.sleep(30)
+        assert time.monotonic() - started < 5
+        with pytest.raises(DeadlineExceededException):
+            deadline.check()
+
+def test_request_stops_retrying():
+    """ Tests that HTTPClient gives up retrying once the backoff would exceed the deadline """
+    flexmock(time).should_receive('sleep').and_return(None)
+    flexmock(requests.Session).should_receive('request').and_raise(requests.exceptions.ConnectionError).times(1)
+
+    with Deadline(0.5):
+        with pytest.raises(DeadlineExceededException):
+            HTTPClient().request("GET", "https://example.com", max_tries=5)
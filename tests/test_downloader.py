@@ -0,0 +1,71 @@
+""" Tests for the Downloader class """
+
+import time
+from pathlib import Path
+
+from flexmock import flexmock
+from yt_dlp import YoutubeDL
+from yt_dlp.utils import DownloadError
+
+from grabbit.deadline import Deadline
+from grabbit.downloader import Downloader
+from grabbit.httpclient import HTTPClient
+from grabbit.typing_custom import GrabbitConfig, Post
+from grabbit.utils import NullLogger
+
+from tests.conftest import PostFactory
+
+def test_downscaled_preview_first(tmp_path: Path, make_post: PostFactory):
+    """ Tests that a downscaled preview is downloaded instead of the original """
+    flexmock(Downloader).should_receive("_download_original").never()
+    flexmock(Downloader).should_receive("_download_preview").and_return([tmp_path / "a.jpg"]).once()
+    downloader = Downloader(NullLogger(), GrabbitConfig(max_height=500))
+    assert downloader.download(make_post("a", url_preview="https://preview.redd.it/a.jpg", downscaled=True), tmp_path / "a") == [tmp_path / "a.jpg"]
+
+def test_fitting_original_first(tmp_path: Path, make_post: PostFactory):
+    """ Tests that an original already fitting under --max-height is not replaced by the preview """
+    flexmock(Downloader).should_receive("_download_original").and_return([tmp_path / "a.jpg"]).once()
+    flexmock(Downloader).should_receive("_download_preview").never()
+    downloader = Downloader(NullLogger(), GrabbitConfig(max_height=500))
+    assert downloader.download(make_post("a", url_preview="https://preview.redd.it/a.jpg"), tmp_path / "a") == [tmp_path / "a.jpg"]
+
+def test_video_errors_dont_fail_host(tmp_path: Path):
+    """ Tests that errors of single videos don't count against their host, unlike errors of the host itself """
+    flexmock(YoutubeDL).should_receive("download").and_raise(DownloadError("ERROR: [youtube] a: Video unavailable"))
+    flexmock(HTTPClient).should_receive("host_failed").never()
+    assert Downloader(NullLogger())._fetch_video("https://youtube.com/watch?v=a", tmp_path / "a") is None  # pylint: disable=protected-access
+
+    flexmock(YoutubeDL).should_receive("download").and_raise(DownloadError("ERROR: [youtube] a: HTTP Error 503: Service Unavailable"))
+    flexmock(HTTPClient).should_receive("host_failed").with_args("youtube.com").once()
+    assert Downloader(NullLogger())._fetch_video("https://youtube.com/watch?v=a", tmp_path / "a") is None  # pylint: disable=protected-access
+
+def _racing_downloader(original_delay: float) -> Downloader:
+    """ Returns a Downloader racing the preview, whose original image takes original_delay seconds to arrive """
+    def download_media(_post: Post, url: str, target: Path) -> list[Path]:
+        if url == "https://i.redd.it/a.jpg":
+            started = time.monotonic()
+            while time.monotonic() - started < original_delay:
+                Deadline.current().check()
+                time.sleep(0.01)
+        target = target.with_suffix(".jpg")
+        target.write_text(url)
+        return [target]
+
+    flexmock(Downloader).should_receive("_download_media").replace_with(download_media)
+    flexmock(Downloader).should_receive("_follow_redirects").replace_with(lambda url: url)
+    flexmock(Downloader).should_receive("_download_wayback").never()
+    return Downloader(NullLogger(), GrabbitConfig(race_preview=0.2))
+
+def test_race_keeps_original(tmp_path: Path, make_post: PostFactory):
+    """ Tests that the original image is kept when it arrives in time, and the preview is discarded """
+    downloader = _racing_downloader(0)
+    assert downloader.download(make_post("a", url_preview="https://preview.redd.it/a.jpg"), tmp_path / "a") == [tmp_path / "a.jpg"]
+    assert (tmp_path / "a.jpg").read_text() == "https://i.redd.it/a.jpg"
+    assert [path.name for path in tmp_path.iterdir()] == ["a.jpg"]
+
+def test_race_falls_back_to_preview(tmp_path: Path, make_post: PostFactory):
+    """ Tests that the preview is kept when the original doesn't arrive in time, without trying the Wayback Machine """
+    downloader = _racing_downloader(5)
+    assert downloader.download(make_post("a", url_preview="https://preview.redd.it/a.jpg"), tmp_path / "a") == [tmp_path / "a.jpg"]
+    assert (tmp_path / "a.jpg").read_text() == "https://preview.redd.it/a.jpg"
+    assert [path.name for path in tmp_path.iterdir()] == ["a.jpg"]
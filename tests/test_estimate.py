@@ -0,0 +1,73 @@
+""" Tests for the estimate function """
+
+import pytest
+from flexmock import flexmock
+from requests.models import Response
+
+from grabbit.downloader import Downloader
+from grabbit.estimate import estimate
+from grabbit.httpclient import HTTPClient, DeadLinkException
+from grabbit.typing_custom import Post, MediaType
+from grabbit.utils import NullLogger
+
+from tests.conftest import PostFactory
+
+@pytest.fixture(name="posts")
+def fixture_posts(make_post: PostFactory) -> list[Post]:
+    """ Fixture of an image, a gallery, a video and an imgur image """
+    return [
+        make_post("a"),
+        make_post("b", "reddit.com", "https://reddit.com/gallery/b", data=["https://i.redd.it/b1.jpg", "https://i.redd.it/b2.jpg"]),
+        make_post("c", "v.redd.it", "https://v.redd.it/c"),
+        make_post("d", "i.imgur.com"),
+    ]
+
+def test_estimate_without_probe(posts: list[Post]):
+    """ Tests that posts are classified without any requests """
+    downloader = Downloader(NullLogger())
+    flexmock(downloader).should_receive("probe").never()
+    downloader.dead_links.add("https://i.imgur.com/d.jpg")
+
+    result = estimate(posts, downloader)
+    assert result.posts == 4
+    assert result.media_types == {MediaType.IMAGE: 1, MediaType.GALLERY: 1, MediaType.VIDEO: 1, MediaType.UNKNOWN: 1}
+    assert result.hosts["i.redd.it"] == 1
+    assert result.gone == 1
+    assert result.size == 0
+    assert result.unsized == 4
+
+def test_estimate_with_probe(posts: list[Post]):
+    """ Tests that the sizes of direct media are added up and gone media is counted """
+    sizes = {"https://i.redd.it/a.jpg": 100, "https://i.redd.it/b1.jpg": 10, "https://i.redd.it/b2.jpg": 20}
+
+    def probe(url: str) -> int:
+        if url not in sizes:
+            raise DeadLinkException(url)
+        return sizes[url]
+
+    downloader = Downloader(NullLogger())
+    flexmock(downloader).should_receive("probe").replace_with(probe)
+
+    result = estimate(posts, downloader, probe=True)
+    assert result.size == 130
+    # The video isn't probed and the imgur image is gone
+    assert result.unsized == 2
+    assert result.gone == 1
+
+def test_probe():
+    """ Tests looking up the size of media and noticing it's gone """
+    ok = Response()
+    ok.status_code = 200
+    ok.url = "https://i.redd.it/a.jpg"
+    ok.headers.update({"content-type": "image/jpeg", "content-length": "100"})
+    removed = Response()
+    removed.status_code = 200
+    removed.url = "https://i.imgur.com/removed.png"
+    responses = iter([ok, removed])
+    flexmock(HTTPClient).should_receive("head").replace_with(lambda *_args, **_kwargs: next(responses))
+
+    downloader = Downloader(NullLogger())
+    assert downloader.probe("https://i.redd.it/a.jpg") == 100
+    with pytest.raises(DeadLinkException):
+        downloader.probe("https://i.imgur.com/d.jpg")
+    assert "https://i.imgur.com/d.jpg" not in downloader.dead_links
@@ -0,0 +1,49 @@
+""" Tests for the Grabbit class """
+
+from pathlib import Path
+
+from flexmock import flexmock
+
+from grabbit.grabbit import Grabbit
+from grabbit.index import MetadataIndex
+from grabbit.typing_custom import GrabbitConfig
+
+from tests.conftest import PostFactory
+
+def test_stop(tmp_path: Path, make_post: PostFactory):
+    """ Tests that a stopped Grabbit starts no more posts and can still save its state """
+    grabbit = Grabbit(user=None, logger=None)
+    grabbit.init(tmp_path)
+    grabbit.stop()
+    flexmock(grabbit).should_receive("_download_post").never()
+    grabbit.download_posts([make_post("a"), make_post("b")])
+    assert grabbit.stopped
+    grabbit.exit()
+    assert (tmp_path / "db.json").exists()
+
+def test_exit_once(tmp_path: Path):
+    """ Tests that exiting again, e.g. from a second Ctrl+C, does nothing """
+    grabbit = Grabbit(user=None, logger=None)
+    grabbit.init(tmp_path)
+    grabbit.exit()
+    flexmock(MetadataIndex).should_receive("close").never()
+    grabbit.exit()
+
+def test_dry_run_creates_nothing(tmp_path: Path):
+    """ Tests that a dry run reads the state without creating the index, packs or output directory """
+    (tmp_path / "db.json").write_text('{"a": "failed"}', encoding="utf-8")
+    grabbit = Grabbit(user=None, logger=None, config=GrabbitConfig(pack_size=1024 * 1024))
+    grabbit.init(tmp_path, dry_run=True)
+    grabbit.init(tmp_path / "new", dry_run=True)
+    grabbit.exit(save=False)
+    assert [path.name for path in tmp_path.iterdir()] == ["db.json"]
+
+def test_failed_posts_quiet(tmp_path: Path):
+    """ Tests that listing the failed posts, e.g. for a dry run, doesn't announce a retry """
+    (tmp_path / "db.json").write_text('{"a": "failed"}', encoding="utf-8")
+    logger = flexmock(debug=lambda *_args: None)
+    logger.should_receive("info").never()
+    grabbit = Grabbit(user=None, logger=logger)
+    grabbit.init(tmp_path, dry_run=True)
+    flexmock(grabbit).should_receive("_info").and_return(iter([]))
+    assert not list(grabbit.failed_posts())
@@ -0,0 +1,91 @@
+""" Tests for the CircuitBreaker and DeadLinks classes """
+
+from pathlib import Path
+import time
+
+import pytest
+import requests
+from flexmock import flexmock
+
+from grabbit.downloader import Downloader
+from grabbit.health import CircuitBreaker, DeadLinks
+from grabbit.httpclient import HTTPClient, HostUnavailableException, DeadLinkException
+from grabbit.utils import NullLogger
+
+def test_breaker_opens():
+    """ Tests that the circuit opens after consecutive failures """
+    breaker = CircuitBreaker(threshold=2, cooldown=60)
+    assert not breaker.failure("example.com")
+    assert not breaker.is_open("example.com")
+    assert breaker.failure("example.com")
+    assert breaker.is_open("example.com")
+    assert not breaker.is_open("example.org")
+
+def test_breaker_success_resets():
+    """ Tests that a success resets the consecutive failures """
+    breaker = CircuitBreaker(threshold=2, cooldown=60)
+    breaker.failure("example.com")
+    breaker.success("example.com")
+    assert not breaker.failure("example.com")
+
+def test_breaker_cooldown():
+    """ Tests that the circuit closes after the cooldown """
+    breaker = CircuitBreaker(threshold=1, cooldown=0)
+    breaker.failure("example.com")
+    assert not breaker.is_open("example.com")
+
+def test_dead_links_save_load(tmp_path: Path):
+    """ Tests that the dead links survive a save and load """
+    dead_links = DeadLinks()
+    dead_links.add("https://example.com/gone.jpg")
+    dead_links.save(tmp_path / "dead.json")
+
+    loaded = DeadLinks()
+    loaded.load(tmp_path / "dead.json")
+    assert "https://example.com/gone.jpg" in loaded
+    assert len(loaded) == 1
+
+def test_dead_links_expire():
+    """ Tests that a dead link is forgotten after the expiry """
+    dead_links = DeadLinks(expiry=60)
+    dead_links.add("https://example.com/gone.jpg")
+    assert "https://example.com/gone.jpg" in dead_links
+
+    later = time.time() + 61
+    flexmock(time).should_receive("time").and_return(later)
+    assert "https://example.com/gone.jpg" not in dead_links
+    assert len(dead_links) == 0
+    assert dead_links.items() == []
+
+def test_client_refuses_dead_link():
+    """ Tests that a URL known to be gone is not requested """
+    client = HTTPClient()
+    client.dead_links.add("https://example.com/gone.jpg")
+    flexmock(requests.Session).should_receive('request').never()
+    with pytest.raises(DeadLinkException):
+        client.get("https://example.com/gone.jpg")
+
+def test_client_doesnt_record_dead_links():
+    """ Tests that a 404 from an API or a probe doesn't mark the URL as gone, only a failed media download does """
+    response = requests.models.Response()
+    response.status_code = 404
+    response.raw = flexmock(close=lambda: None, release_conn=lambda: None)
+    flexmock(requests.Session).should_receive('request').and_return(response).times(3)
+
+    client = HTTPClient()
+    assert client.get("https://web.archive.org/cdx/search/cdx", {"url": "https://example.com/a.jpg"}).status_code == 404
+    assert client.head("https://example.com/gone.jpg").status_code == 404
+    assert "https://web.archive.org/cdx/search/cdx" not in client.dead_links
+    assert "https://example.com/gone.jpg" not in client.dead_links
+
+    downloader = Downloader(NullLogger())
+    assert downloader._fetch_image("https://example.com/gone.jpg", Path("gone")) is None  # pylint: disable=protected-access
+    assert "https://example.com/gone.jpg" in downloader.dead_links
+
+def test_client_short_circuits_host():
+    """ Tests that a host with an open circuit is not requested """
+    client = HTTPClient(breaker=CircuitBreaker(threshold=1, cooldown=60))
+    client.host_failed("example.com")
+    flexmock(requests.Session).should_receive('request').never()
+    with pytest.raises(HostUnavailableException):
+        client.get("https://example.com/image.jpg")
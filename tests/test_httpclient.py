@@ -10,10 +10,15 @@ from flexmock import flexmock
 
 from grabbit.httpclient import HTTPClient, RetryLimitExceededException
 
+def _response(status_code: int) -> Response:
+    response = Response()
+    response.status_code = status_code
+    return response
+
 def test_successful_request():
     """ Tests a successful request """
-    mock_response = flexmock(Response)
-    flexmock(requests).should_receive('request').and_return(mock_response)
+    mock_response = _response(200)
+    flexmock(requests.Session).should_receive('request').and_return(mock_response)
 
     client = HTTPClient()
     response = client.request("GET", "https://example.com")
@@ -22,12 +27,12 @@ def test_successful_request():
 
 def test_retry_logic():
     """ Tests the retry logic """
-    mock_response = flexmock(Response)
+    mock_response = _response(200)
     # faking the delay for testing
     flexmock(time).should_receive('sleep').and_return(None)
     # 5x ordered() because: https://github.com/flexmock/flexmock/issues/8
-    flexmock(requests).should_receive('request').and_raise(requests.exceptions.ConnectionError).times(5).ordered().ordered().ordered().ordered().ordered()
-    flexmock(requests).should_receive('request').and_return(mock_response).ordered()
+    flexmock(requests.Session).should_receive('request').and_raise(requests.exceptions.ConnectionError).times(5).ordered().ordered().ordered().ordered().ordered()
+    flexmock(requests.Session).should_receive('request').and_return(mock_response).ordered()
 
     client = HTTPClient()
     response = client.request("GET", "https://example.com", max_tries=6)
@@ -38,7 +43,7 @@ def test_retry_limit_exceeded():
     """ Tests the retry limit mechanism """
     # faking the delay for testing
     flexmock(time).should_receive('sleep').and_return(None)
-    flexmock(requests).should_receive('request').and_raise(requests.exceptions.ConnectionError).times(2)
+    flexmock(requests.Session).should_receive('request').and_raise(requests.exceptions.ConnectionError).times(2)
 
     client = HTTPClient()
     with pytest.raises(RetryLimitExceededException):
@@ -47,8 +52,8 @@ def test_retry_limit_exceeded():
 
 def test_get_method():
     """ Tests the GET method"""
-    mock_response = flexmock(Response)
-    flexmock(requests).should_receive('request').with_args("GET", "https://example.com", params={}, headers={}, timeout=30).and_return(mock_response)
+    mock_response = _response(200)
+    flexmock(requests.Session).should_receive('request').with_args("GET", "https://example.com", params={}, headers={}, timeout=30).and_return(mock_response)
 
     client = HTTPClient()
     response = client.get("https://example.com")
@@ -57,8 +62,8 @@ def test_get_method():
 
 def test_head_method():
     """ Tests the HEAD method"""
-    mock_response = flexmock(Response)
-    flexmock(requests).should_receive('request').with_args("HEAD", "https://example.com", params={}, headers={}, timeout=30).and_return(mock_response)
+    mock_response = _response(200)
+    flexmock(requests.Session).should_receive('request').with_args("HEAD", "https://example.com", params={}, headers={}, timeout=30).and_return(mock_response)
 
     client = HTTPClient()
     response = client.head("https://example.com")
@@ -0,0 +1,52 @@
+""" Tests for the MetadataIndex class """
+
+from pathlib import Path
+
+import pytest
+
+from grabbit.index import MetadataIndex, metadata_files
+
+METADATA = {
+    "id": "abc",
+    "sub": "aww",
+    "title": "Test Post",
+    "author": "author",
+    "date": 1234567890.0,
+    "files": ["abc/0.jpg", "abc/1.png"],
+    "integrity": {"abc/0.jpg": {"size": 10, "sha256": "00"}, "abc/1.png": {"size": 5, "sha256": "11"}},
+}
+
+@pytest.fixture(name="index")
+def fixture_index(tmp_path: Path) -> MetadataIndex:
+    """ Fixture of an empty index """
+    return MetadataIndex(tmp_path / "index.db")
+
+def test_add_get(index: MetadataIndex):
+    """ Tests that added metadata is returned as it was added """
+    index.add(METADATA)
+    assert index.get("abc") == METADATA
+    assert index.get("def") is None
+    assert "abc" in index
+    assert len(index) == 1
+    assert list(index) == [METADATA]
+
+def test_replace(index: MetadataIndex):
+    """ Tests that adding a post again replaces it """
+    index.add(METADATA)
+    index.add({**METADATA, "title": "New Title"})
+    assert len(index) == 1
+    assert index.get("abc")["title"] == "New Title"
+
+def test_persisted(tmp_path: Path, index: MetadataIndex):
+    """ Tests that committed metadata survives reopening """
+    index.add(METADATA)
+    index.close()
+    assert MetadataIndex(tmp_path / "index.db").get("abc") == METADATA
+
+def test_metadata_files(tmp_path: Path):
+    """ Tests that only metadata files in subreddit directories are found """
+    (tmp_path / "db.json").write_text("{}", encoding="utf-8")
+    (tmp_path / "aww" / "abc").mkdir(parents=True)
+    (tmp_path / "aww" / "abc.json").write_text("{}", encoding="utf-8")
+    (tmp_path / "aww" / "abc" / "0.jpg").write_bytes(b"")
+    assert list(metadata_files(tmp_path)) == [tmp_path / "aww" / "abc.json"]
@@ -0,0 +1,105 @@
+""" Tests for reading posts from raw Reddit listings """
+
+from pathlib import Path
+
+import pytest
+from flexmock import flexmock
+from praw import Reddit
+
+from grabbit.grabbit import Grabbit
+from grabbit.listing import saved_listing, info_listing
+from grabbit.state import State
+from grabbit.typing_custom import RedditUser, GrabbitConfig, PostStatus
+
+def _post(post_id: str, **data) -> dict:
+    return {"kind": "t3", "data": {
+        "id": post_id,
+        "subreddit": "aww",
+        "title": f"Post {post_id}",
+        "author": "author",
+        "created_utc": 1234567890.0,
+        "url": f"https://i.redd.it/{post_id}.jpg",
+        "domain": "i.redd.it",
+        "is_self": False,
+        **data,
+    }}
+
+def _listing(children: list[dict], after: str | None = None) -> dict:
+    return {"kind": "Listing", "data": {"children": children, "after": after}}
+
+@pytest.fixture(name="grabbit")
+def fixture_grabbit(tmp_path: Path) -> Grabbit:
+    """ Fixture of a Grabbit instance reading raw listings """
+    grabbit = Grabbit(RedditUser("user", "password", "client_id", "client_secret"), None, GrabbitConfig(raw_listings=True))
+    grabbit.init(tmp_path)
+    return grabbit
+
+def test_saved_listing_pages():
+    """ Tests that the saved listing is followed page by page """
+    reddit = flexmock()
+    reddit.should_receive("request").with_args(method="GET", path="user/user/saved", params={"limit": 100}).and_return(_listing([_post("a")], "t3_a")).once()
+    reddit.should_receive("request").with_args(method="GET", path="user/user/saved", params={"limit": 100, "after": "t3_a"}).and_return(_listing([_post("b")])).once()
+    assert [thing["data"]["id"] for thing in saved_listing(reddit, "user")] == ["a", "b"]
+
+def test_info_listing_batches():
+    """ Tests that the things are looked up in batches """
+    reddit = flexmock()
+    reddit.should_receive("request").and_return(_listing([])).times(3)
+    assert not list(info_listing(reddit, [f"t3_{i}" for i in range(250)]))
+
+def test_raw_posts(grabbit: Grabbit):
+    """ Tests that posts, crossposts and galleries are read from the listing alone """
+    gallery = _post(
+        "g",
+        url="https://www.reddit.com/gallery/g",
+        domain="reddit.com",
+        gallery_data={"items": [{"media_id": "m1"}, {"media_id": "m2"}]},
+        media_metadata={"m1": {"m": "image/jpg", "s": {"u": "https://i.redd.it/m1.jpg", "y": 100}}},
+    )
+    crosspost = _post("x", crosspost_parent_list=[_post("o", subreddit="pics", author=None)["data"]])
+    comment = {"kind": "t1", "data": {"id": "c"}}
+    flexmock(Reddit).should_receive("request").and_return(_listing([_post("a"), gallery, crosspost, comment])).once()
+
+    posts = list(grabbit.saved_posts())
+    assert [post.id for post in posts] == ["a", "g", "o"]
+    assert posts[1].data == ["https://i.redd.it/m1.jpg"]
+    assert (posts[2].sub, posts[2].author) == ("pics", "[deleted]")
+    assert grabbit.total_posts() == 1
+    grabbit.exit(save=False)
+
+def test_raw_posts_skip_downloaded(tmp_path: Path):
+    """ Tests that already downloaded posts are skipped """
+    state = State()
+    state["a"] = PostStatus.DOWNLOADED
+    state.save(tmp_path / "db.json")
+    grabbit = Grabbit(RedditUser("user", "password", "client_id", "client_secret"), None, GrabbitConfig(raw_listings=True))
+    grabbit.init(tmp_path)
+
+    flexmock(Reddit).should_receive("request").and_return(_listing([_post("a"), _post("b")]))
+    assert [post.id for post in grabbit.saved_posts()] == ["b"]
+    grabbit.exit(save=False)
+
+def _preview(height: int, resolutions: list[int], **image) -> dict:
+    return {"images": [{
+        "source": {"url": f"https://preview.redd.it/{height}.jpg", "height": height},
+        "resolutions": [{"url": f"https://preview.redd.it/{r}.jpg", "height": r} for r in resolutions],
+        **image,
+    }]}
+
+def test_raw_posts_renditions(tmp_path: Path):
+    """ Tests that the preview is only marked downscaled when a smaller rendition was picked, and that animated images stay animated """
+    animated = _preview(1000, [320], variants={"gif": {
+        "source": {"url": "https://preview.redd.it/1000.gif", "height": 1000},
+        "resolutions": [{"url": "https://preview.redd.it/320.gif", "height": 320}],
+    }})
+    posts = [_post("small", preview=_preview(400, [108, 216])), _post("large", preview=_preview(1000, [320, 640])), _post("gif", preview=animated)]
+    flexmock(Reddit).should_receive("request").and_return(_listing(posts)).once()
+
+    grabbit = Grabbit(RedditUser("user", "password", "client_id", "client_secret"), None, GrabbitConfig(raw_listings=True, max_height=500))
+    grabbit.init(tmp_path)
+    assert [(post.url_preview, post.downscaled) for post in grabbit.saved_posts()] == [
+        ("https://preview.redd.it/400.jpg", False),
+        ("https://preview.redd.it/320.jpg", True),
+        ("https://preview.redd.it/320.gif", True),
+    ]
+    grabbit.exit(save=False)
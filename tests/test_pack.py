@@ -0,0 +1,97 @@
+""" Tests for the Packer and PackIndex classes """
+
+from pathlib import Path
+import tarfile
+
+from grabbit.index import MetadataIndex
+from grabbit.integrity import describe_file
+from grabbit.pack import Packer, PackIndex, extract
+from grabbit.state import State
+from grabbit.typing_custom import PostStatus
+from grabbit.verify import Verifier
+
+def _packer(tmp_path: Path, max_size: int = 1024 * 1024) -> Packer:
+    return Packer(tmp_path / "packs", PackIndex(tmp_path / "packs.db", tmp_path / "packs"), max_size=max_size)
+
+def _file(tmp_path: Path, name: str, data: bytes) -> Path:
+    path = tmp_path / "staging" / name
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(data)
+    return path
+
+def test_pack_and_extract(tmp_path: Path):
+    """ Tests that packed files can be read back through the index and from the tar itself """
+    packer = _packer(tmp_path)
+    packer.add("aww/a.jpg", _file(tmp_path, "a.jpg", b"first"))
+    packer.add("aww/b/0.png", _file(tmp_path, "0.png", b"second"))
+    packer.close()
+
+    with tarfile.open(tmp_path / "packs" / "pack-00000.tar") as tar:
+        assert tar.getnames() == ["aww/a.jpg", "aww/b/0.png"]
+
+    index = PackIndex(tmp_path / "packs.db", tmp_path / "packs")
+    assert len(index) == 2
+    assert extract(index, tmp_path / "out", ["aww/b/*"]) == 1
+    assert (tmp_path / "out" / "aww" / "b" / "0.png").read_bytes() == b"second"
+    assert not (tmp_path / "out" / "aww" / "a.jpg").exists()
+
+def test_pack_rolls_over(tmp_path: Path):
+    """ Tests that a full pack is followed by a new one and that every Packer starts a pack of its own """
+    # A closed pack takes at least 10 KB, the size of a tar record
+    packer = _packer(tmp_path, max_size=16384)
+    packer.add("aww/a.jpg", _file(tmp_path, "a.jpg", b"x" * 20000))
+    packer.add("aww/b.jpg", _file(tmp_path, "b.jpg", b"y" * 10))
+    packer.close()
+
+    packer = _packer(tmp_path, max_size=16384)
+    packer.add("aww/c.jpg", _file(tmp_path, "c.jpg", b"z" * 10))
+    packer.close()
+
+    index = PackIndex(tmp_path / "packs.db", tmp_path / "packs")
+    assert {name: packed.pack for (name, packed) in index} == {
+        "aww/a.jpg": "pack-00000.tar",
+        "aww/b.jpg": "pack-00001.tar",
+        "aww/c.jpg": "pack-00002.tar",
+    }
+    with tarfile.open(tmp_path / "packs" / "pack-00001.tar") as tar:
+        assert tar.getnames() == ["aww/b.jpg"]
+
+def test_pack_after_crash(tmp_path: Path):
+    """ Tests that a pack left unfinished by a crash, even cut off midway, doesn't break the next run """
+    packer = _packer(tmp_path)
+    packer.add("aww/a.jpg", _file(tmp_path, "a.jpg", b"x" * 2000))
+    packer.commit()
+    packer.add("aww/b.jpg", _file(tmp_path, "b.jpg", b"y" * 2000))
+    packer.commit()
+    cut = packer.index.get("aww/b.jpg")
+    packer.index.close()
+    assert cut is not None
+    with open(tmp_path / "packs" / "pack-00000.tar", "r+b") as pack:
+        pack.truncate(cut.offset + 1000)
+
+    packer = _packer(tmp_path)
+    packer.add("aww/c.jpg", _file(tmp_path, "c.jpg", b"z" * 10))
+    packer.close()
+
+    index = PackIndex(tmp_path / "packs.db", tmp_path / "packs")
+    packed = dict(index)
+    assert packed["aww/c.jpg"].pack == "pack-00001.tar"
+    assert index.intact(packed["aww/a.jpg"])
+    assert not index.intact(packed["aww/b.jpg"])
+
+def test_verify_packed(tmp_path: Path):
+    """ Tests that packed files are verified against their recorded size and checksum """
+    path = _file(tmp_path, "a.jpg", b"\xff\xd8\xff\xe0")
+    packer = _packer(tmp_path)
+    packer.add("aww/a.jpg", path)
+    packer.close()
+
+    index = MetadataIndex(tmp_path / "index.db")
+    index.add({"id": "a", "sub": "aww", "title": "", "author": "", "date": 0, "files": ["a.jpg"], "integrity": {"a.jpg": describe_file(path)}})
+    state = State()
+    state["a"] = PostStatus.DOWNLOADED
+    packs = PackIndex(tmp_path / "packs.db", tmp_path / "packs")
+    assert not Verifier(tmp_path, hash_files=True).verify(state, index, packs)
+
+    (tmp_path / "packs" / "pack-00000.tar").write_bytes(b"")
+    assert Verifier(tmp_path).verify(state, index, packs) == {"a": "a.jpg: pack pack-00000.tar is missing or truncated"}
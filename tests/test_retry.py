@@ -0,0 +1,47 @@
+""" Tests for the RetryQueue class """
+
+from pathlib import Path
+
+from grabbit.retry import RetryQueue
+
+def test_backoff_doubles():
+    """ Tests that the delay between attempts doubles with every failure """
+    queue = RetryQueue(max_attempts=5, delay=10)
+    assert queue.record("a", "reason", now=0).next_attempt == 10
+    assert queue.record("a", "reason", now=100).next_attempt == 120
+    assert queue.record("a", "reason", now=200).next_attempt == 240
+    assert queue.get("a").attempts == 3
+
+def test_due():
+    """ Tests which posts are eligible for another attempt """
+    queue = RetryQueue(max_attempts=5, delay=10)
+    queue.record("a", "reason", now=0)
+    assert queue.due(["a", "b"], now=5) == ["b"]
+    assert queue.due(["a", "b"], now=10) == ["a", "b"]
+
+def test_parked():
+    """ Tests that a post is parked after running out of attempts """
+    queue = RetryQueue(max_attempts=2, delay=10)
+    queue.record("a", "reason", now=0)
+    assert not queue.parked("a")
+    queue.record("a", "reason", now=0)
+    assert queue.parked("a")
+    assert queue.due(["a"], now=1000) == []
+
+def test_forget():
+    """ Tests that a forgotten post is eligible immediately """
+    queue = RetryQueue(delay=10)
+    queue.record("a", "reason", now=0)
+    queue.forget("a")
+    assert queue.get("a") is None
+    assert queue.due(["a"], now=0) == ["a"]
+
+def test_save_load(tmp_path: Path):
+    """ Tests that the queue survives a save and load """
+    queue = RetryQueue(delay=10)
+    queue.record("a", "Dead link", now=0)
+    queue.save(tmp_path / "retry.json")
+
+    loaded = RetryQueue(delay=10)
+    loaded.load(tmp_path / "retry.json")
+    assert loaded.get("a") == queue.get("a")
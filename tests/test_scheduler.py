@@ -0,0 +1,115 @@
+""" Tests for the Scheduler class """
+
+import threading
+import time
+from typing import Iterator
+
+from grabbit.scheduler import Scheduler
+from grabbit.typing_custom import Post, MediaType
+
+from tests.conftest import PostFactory
+
+def _classify(post: Post) -> MediaType:
+    return MediaType.VIDEO if post.source == "v.redd.it" else MediaType.IMAGE
+
+def test_all_posts_processed(make_post: PostFactory):
+    """ Tests that every post is processed exactly once and its result yielded """
+    scheduler = Scheduler(_classify, {MediaType.IMAGE: 2, MediaType.VIDEO: 1})
+    posts = [make_post(str(i), "i.redd.it" if i % 2 else "v.redd.it") for i in range(10)]
+
+    results = {post.id: result for (post, result, _) in scheduler.run(posts, lambda post: post.id * 2)}
+    assert results == {post.id: post.id * 2 for post in posts}
+
+def test_exception_is_yielded(make_post: PostFactory):
+    """ Tests that an exception raised by the work is yielded instead of propagated """
+    def work(post: Post) -> str:
+        raise ValueError(post.id)
+
+    scheduler = Scheduler(_classify, {MediaType.IMAGE: 1})
+    [(post, result, error)] = list(scheduler.run([make_post("1", "i.redd.it")], work))
+    assert post.id == "1"
+    assert result is None
+    assert isinstance(error, ValueError)
+
+def test_cheap_queue_not_blocked(make_post: PostFactory):
+    """ Tests that image posts are finished while a video post is still being processed """
+    video_release = threading.Event()
+
+    def work(post: Post) -> str:
+        if post.source == "v.redd.it":
+            assert video_release.wait(timeout=5)
+        return post.id
+
+    scheduler = Scheduler(_classify, {MediaType.IMAGE: 1, MediaType.VIDEO: 1})
+    posts = [make_post("video", "v.redd.it"), *[make_post(str(i), "i.redd.it") for i in range(5)]]
+
+    finished = []
+    for (post, _, _) in scheduler.run(posts, work):
+        finished.append(post.id)
+        if len(finished) == 5:
+            video_release.set()
+
+    assert finished[-1] == "video"
+
+def test_read_ahead_bounded(make_post: PostFactory):
+    """ Tests that the posts are read only a bounded number ahead of the work """
+    read = []
+
+    def posts() -> Iterator[Post]:
+        for i in range(1000):
+            read.append(i)
+            yield make_post(str(i), "i.redd.it")
+
+    scheduler = Scheduler(_classify, {MediaType.IMAGE: 1})
+    results = scheduler.run(posts(), lambda post: post.id)
+    next(results)
+    assert len(read) <= 200
+    assert len(list(results)) == 999
+
+def test_stop(make_post: PostFactory):
+    """ Tests that a stopped scheduler starts no more posts and leaves out the interrupted ones """
+    started = threading.Event()
+    stopped = threading.Event()
+
+    def work(post: Post) -> str:
+        if post.id == "0":
+            started.set()
+            assert stopped.wait(timeout=5)
+            raise InterruptedError(post.id)
+        return post.id
+
+    scheduler = Scheduler(_classify, {MediaType.IMAGE: 1, MediaType.VIDEO: 1})
+    posts = [make_post("0", "v.redd.it"), *[make_post(str(i), "i.redd.it") for i in range(1, 10)]]
+    finished = []
+    for (post, _, error) in scheduler.run(posts, work):
+        assert error is None
+        finished.append(post.id)
+        if len(finished) == 2:
+            assert started.wait(timeout=5)
+            scheduler.stop()
+            stopped.set()
+
+    assert scheduler.stopped
+    assert len(finished) <= 3
+    assert "0" not in finished
+
+def test_slow_backlog_doesnt_hold_up_cheap_posts(make_post: PostFactory):
+    """ Tests that a long listing with many slow posts doesn't slow the cheap posts down to their pace """
+    def work(post: Post) -> str:
+        if post.source == "v.redd.it":
+            time.sleep(0.01)
+        return post.id
+
+    scheduler = Scheduler(_classify, {MediaType.IMAGE: 8, MediaType.VIDEO: 2})
+    posts = [make_post(str(i), "v.redd.it" if i % 4 == 0 else "i.redd.it") for i in range(2000)]
+
+    images = videos = 0
+    for (post, _, _) in scheduler.run(posts, work):
+        if post.source == "v.redd.it":
+            videos += 1
+        else:
+            images += 1
+            if images == 1500:
+                # The 500 videos take 2.5 s at least, the images mustn't have waited for many of them
+                assert videos < 100
+    assert (images, videos) == (1500, 500)
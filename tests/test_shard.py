@@ -0,0 +1,52 @@
+""" Tests for the shard helper functions """
+
+from pathlib import Path
+
+from grabbit.retry import RetryQueue
+from grabbit.shard import shard_of, write_plan, read_plan, merge_shards
+from grabbit.state import State
+from grabbit.typing_custom import PostStatus
+
+from tests.conftest import PostFactory
+
+def test_shard_of():
+    """ Tests that posts are spread across shards the same way every time """
+    shards = [shard_of(f"post{i}", 4) for i in range(100)]
+    assert set(shards) == {0, 1, 2, 3}
+    assert shards == [shard_of(f"post{i}", 4) for i in range(100)]
+
+def test_write_read_plan(tmp_path: Path, make_post: PostFactory):
+    """ Tests that every post ends up in exactly one manifest """
+    posts = [make_post(f"post{i}") for i in range(20)]
+    counts = write_plan(posts, tmp_path, 3)
+    assert len(counts) == 3
+    assert sum(counts.values()) == 20
+
+    read = [post for path in counts for post in read_plan(path)]
+    assert sorted(read, key=lambda post: post.id) == sorted(posts, key=lambda post: post.id)
+    for path in counts:
+        assert all(shard_of(post.id, 3) == list(counts).index(path) for post in read_plan(path))
+
+def _save_state(directory: Path, **statuses: PostStatus) -> None:
+    directory.mkdir(parents=True, exist_ok=True)
+    state = State()
+    state.update(statuses)
+    state.save(directory / "db.json")
+
+def test_merge_shards(tmp_path: Path):
+    """ Tests that the most final status of a post wins and retries of finished posts are dropped """
+    _save_state(tmp_path, a=PostStatus.FAILED, b=PostStatus.DOWNLOADED)
+    retries = RetryQueue()
+    retries.record("a", "reason")
+    retries.save(tmp_path / "retry.json")
+
+    _save_state(tmp_path / "shard-000", a=PostStatus.DOWNLOADED, c=PostStatus.FAILED)
+    _save_state(tmp_path / "shard-001", b=PostStatus.FAILED, d=PostStatus.SKIPPED)
+
+    assert merge_shards(tmp_path, [tmp_path / "shard-000", tmp_path / "shard-001"]) == 2
+
+    state = State()
+    state.load(tmp_path / "db.json")
+    assert state == {"a": PostStatus.DOWNLOADED, "b": PostStatus.DOWNLOADED, "c": PostStatus.FAILED, "d": PostStatus.SKIPPED}
+    retries.load(tmp_path / "retry.json")
+    assert retries.get("a") is None
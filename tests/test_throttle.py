@@ -0,0 +1,74 @@
+""" Tests for the ConcurrencyLimiter class """
+
+from threading import Thread
+import time
+
+import pytest
+import requests
+from flexmock import flexmock
+
+from grabbit.deadline import Deadline, DeadlineExceededException
+from grabbit.httpclient import HTTPClient
+from grabbit.throttle import ConcurrencyLimiter
+
+def test_additive_increase():
+    """ Tests that the limit grows by about one after a round of healthy responses """
+    limiter = ConcurrencyLimiter(initial=2, maximum=3)
+    for _ in range(3):
+        limiter.success("example.com", 0.1)
+    assert limiter.limit("example.com") == 3
+    for _ in range(10):
+        limiter.success("example.com", 0.1)
+    assert limiter.limit("example.com") == 3
+    assert limiter.limit("example.org") == 2
+
+def test_slow_responses_dont_increase():
+    """ Tests that responses much slower than usual don't count as healthy """
+    limiter = ConcurrencyLimiter(initial=2)
+    limiter.success("example.com", 0.1)
+    limiter.success("example.com", 5)
+    limiter.success("example.com", 5)
+    assert limiter.limit("example.com") == 2
+
+def test_multiplicative_decrease():
+    """ Tests that the limit halves on overload, once for failures happening together """
+    limiter = ConcurrencyLimiter(initial=8)
+    limiter.overload("example.com")
+    limiter.overload("example.com")
+    assert limiter.limit("example.com") == 4
+
+def test_slot_waits():
+    """ Tests that a request waits for a slot of the host to be released """
+    limiter = ConcurrencyLimiter(initial=1)
+    order = []
+
+    def request(name: str):
+        with limiter.slot("example.com"):
+            order.append(name)
+            time.sleep(0.05)
+            order.append(name)
+
+    threads = [Thread(target=request, args=(name,)) for name in ["a", "b"]]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert order in (["a", "a", "b", "b"], ["b", "b", "a", "a"])
+
+def test_slot_deadline():
+    """ Tests that waiting for a slot gives up once the deadline passes """
+    limiter = ConcurrencyLimiter(initial=1)
+    with limiter.slot("example.com"):
+        with Deadline(0.1):
+            with pytest.raises(DeadlineExceededException):
+                with limiter.slot("example.com"):
+                    pass
+
+def test_client_backs_off():
+    """ Tests that HTTPClient backs off from a host answering 429 """
+    response = requests.models.Response()
+    response.status_code = 429
+    flexmock(requests.Session).should_receive("request").and_return(response)
+    flexmock(ConcurrencyLimiter).should_receive("overload").with_args("example.com").once()
+
+    HTTPClient().get("https://example.com/image.jpg")
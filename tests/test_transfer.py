@@ -0,0 +1,62 @@
+""" Tests for the Transfer class """
+
+from pathlib import Path
+import os
+import time
+
+import pytest
+from flexmock import flexmock
+
+from grabbit.deadline import Deadline, DeadlineExceededException
+from grabbit.transfer import Transfer
+from grabbit.typing_custom import Durability
+
+def test_uncapped():
+    """ Tests that an uncapped transfer never waits """
+    flexmock(time).should_receive("sleep").never()
+    Transfer().throttle(10 * 1024 * 1024)
+
+def test_throttle_books_bandwidth():
+    """ Tests that chunks received together wait in turns for their share of the bandwidth """
+    delays = []
+    flexmock(time).should_receive("sleep").replace_with(delays.append)
+    transfer = Transfer(rate=1000)
+    transfer.throttle(500)
+    transfer.throttle(500)
+    assert delays[0] == pytest.approx(0.5, abs=0.05)
+    assert delays[1] == pytest.approx(1.0, abs=0.05)
+
+def test_throttle_deadline():
+    """ Tests that waiting for bandwidth gives up once the deadline would pass """
+    transfer = Transfer(rate=1000)
+    with Deadline(0.1):
+        with pytest.raises(DeadlineExceededException):
+            transfer.throttle(1000)
+
+def test_chunk_size():
+    """ Tests that a capped rate is shared in small chunks """
+    assert Transfer(buffer_size=1024 * 1024).chunk_size == 1024 * 1024
+    assert Transfer(rate=800 * 1024, buffer_size=1024 * 1024).chunk_size == 100 * 1024
+
+def test_write_short(tmp_path: Path):
+    """ Tests that a preallocated file which got fewer bytes than expected isn't padded """
+    written = Transfer().write([b"abc", b"def"], tmp_path / "file", size=100)
+    assert written == 6
+    assert (tmp_path / "file").read_bytes() == b"abcdef"
+
+def test_durability_file(tmp_path: Path):
+    """ Tests that a file and its directory (except on Windows) are synced right away """
+    (tmp_path / "a").write_bytes(b"a")
+    flexmock(os).should_receive("fsync").times(1 if os.name == "nt" else 2)
+    Transfer(durability=Durability.FILE).finish(tmp_path / "a")
+
+def test_durability_batch(tmp_path: Path):
+    """ Tests that files are synced together with their directory (except on Windows) on flush """
+    (tmp_path / "a").write_bytes(b"a")
+    (tmp_path / "b").write_bytes(b"b")
+    flexmock(os).should_receive("fsync").times(2 if os.name == "nt" else 3)
+    transfer = Transfer(durability=Durability.BATCH)
+    transfer.finish(tmp_path / "a")
+    transfer.finish(tmp_path / "b")
+    transfer.flush()
+    transfer.flush()
@@ -2,12 +2,13 @@
 # @generated [partially] GPT-4o: Prompt: Write pytest unit tests for these functions.
 
 from pathlib import Path
+import importlib.metadata
 from tempfile import NamedTemporaryFile
 from unittest.mock import patch, mock_open
 from requests.models import Response
 
-from grabbit.utils import guess_media_type, guess_media_extension, load_gdpr_saved_posts_csv, ensure_post_id, NullLogger, get_version
-from grabbit.typing_custom import MediaType
+from grabbit.utils import guess_media_type, guess_media_extension, load_gdpr_saved_posts_csv, ensure_post_id, NullLogger, get_version, pick_rendition, format_size
+from grabbit.typing_custom import MediaType, Quality
 
 def test_guess_media_type():
     """ Tests the guess_media_type function """
@@ -35,6 +36,18 @@ def test_guess_media_extension():
     response.headers["content-type"] = "application/json"
     assert guess_media_extension(response) == ".json"
 
+def test_pick_rendition():
+    """ Tests the pick_rendition function """
+    source = ("full", 2000)
+    resolutions = [("small", 200), ("medium", 640), ("large", 1080)]
+
+    assert pick_rendition(source, resolutions, Quality.FULL, None) == "full"
+    assert pick_rendition(source, resolutions, Quality.FULL, 1080) == "large"
+    assert pick_rendition(source, resolutions, Quality.FULL, 100) == "small"
+    assert pick_rendition(source, resolutions, Quality.PREVIEW, None) == "large"
+    assert pick_rendition(source, resolutions, Quality.PREVIEW, 700) == "medium"
+    assert pick_rendition(source, [], Quality.PREVIEW, 700) == "full"
+
 def test_load_gdpr_saved_posts_csv():
     """ Tests the load_gdpr_saved_posts_csv function """
     with NamedTemporaryFile(delete=False, mode='w', encoding='utf-8', newline='') as temp_file:
@@ -74,9 +87,22 @@ def test_null_logger(capsys):
 
 def test_get_version():
     """ Tests the get_version function """
+    with patch('importlib.metadata.version', return_value="1.0.0"):
+        assert get_version() == "1.0.0"
+
+def test_get_version_source_checkout():
+    """ Tests the get_version function when the package isn't installed """
     mock_toml_content = b"""
     [project]
     version = "1.0.0"
     """
-    with patch('builtins.open', mock_open(read_data=mock_toml_content)):
+    with patch('importlib.metadata.version', side_effect=importlib.metadata.PackageNotFoundError), \
+            patch('builtins.open', mock_open(read_data=mock_toml_content)):
         assert get_version() == "1.0.0"
+
+def test_format_size():
+    """ Tests the format_size function """
+    assert format_size(512) == "512 B"
+    assert format_size(1536) == "1.5 KB"
+    assert format_size(3 * 1024 ** 3) == "3.0 GB"
+    assert format_size(2 * 1024 ** 4) == "2.0 TB"
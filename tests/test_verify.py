@@ -0,0 +1,76 @@
+""" Tests for the Verifier class """
+
+from pathlib import Path
+import json
+
+import pytest
+
+from grabbit.index import MetadataIndex
+from grabbit.integrity import describe_file, has_valid_magic
+from grabbit.state import State
+from grabbit.typing_custom import PostStatus
+from grabbit.verify import Verifier
+
+JPEG = b"\xff\xd8\xff\xe0" + b"\x00" * 60
+
+@pytest.fixture(name="archive")
+def fixture_archive(tmp_path: Path) -> Path:
+    """ Fixture of an archive with a single intact post """
+    sub = tmp_path / "aww"
+    sub.mkdir()
+    (sub / "good.jpg").write_bytes(JPEG)
+    (sub / "good.json").write_text(json.dumps({
+        "id": "good",
+        "files": ["good.jpg"],
+        "integrity": {"good.jpg": describe_file(sub / "good.jpg")},
+    }), encoding="utf-8")
+    return tmp_path
+
+def _state(**statuses: PostStatus) -> State:
+    state = State()
+    state.update(statuses)
+    return state
+
+def test_intact(archive: Path):
+    """ Tests that an intact post is not reported """
+    assert not Verifier(archive, hash_files=True).verify(_state(good=PostStatus.DOWNLOADED))
+
+def test_truncated(archive: Path):
+    """ Tests that a file smaller than recorded is reported """
+    (archive / "aww" / "good.jpg").write_bytes(JPEG[:10])
+    assert "good" in Verifier(archive).verify(_state(good=PostStatus.DOWNLOADED))
+
+def test_corrupted(archive: Path):
+    """ Tests that a file with a different checksum is only reported when hashing """
+    (archive / "aww" / "good.jpg").write_bytes(JPEG[:-1] + b"\x01")
+    assert not Verifier(archive).verify(_state(good=PostStatus.DOWNLOADED))
+    assert "good" in Verifier(archive, hash_files=True).verify(_state(good=PostStatus.DOWNLOADED))
+
+def test_missing(archive: Path):
+    """ Tests that missing files and metadata are reported """
+    (archive / "aww" / "good.jpg").unlink()
+    broken = Verifier(archive).verify(_state(good=PostStatus.DOWNLOADED, other=PostStatus.DOWNLOADED, gone=PostStatus.FAILED))
+    assert set(broken) == {"good", "other"}
+
+def test_legacy_metadata(archive: Path):
+    """ Tests that files without recorded integrity have their signature checked """
+    (archive / "aww" / "legacy.jpg").write_bytes(b"<html></html>")
+    (archive / "aww" / "legacy.json").write_text(json.dumps({"id": "legacy", "files": ["legacy.jpg"]}), encoding="utf-8")
+    assert "legacy" in Verifier(archive).verify(_state(good=PostStatus.DOWNLOADED, legacy=PostStatus.DOWNLOADED))
+
+def test_has_valid_magic(tmp_path: Path):
+    """ Tests the has_valid_magic function """
+    (tmp_path / "a.jpg").write_bytes(JPEG)
+    (tmp_path / "a.png").write_bytes(JPEG)
+    (tmp_path / "a.md").write_bytes(b"text")
+    assert has_valid_magic(tmp_path / "a.jpg")
+    assert not has_valid_magic(tmp_path / "a.png")
+    assert has_valid_magic(tmp_path / "a.md")
+
+def test_indexed(archive: Path):
+    """ Tests that posts only present in the index are verified """
+    index = MetadataIndex(archive / "index.db")
+    index.add({"id": "indexed", "sub": "aww", "title": "", "author": "", "date": 0,
+               "files": ["indexed.jpg"], "integrity": {"indexed.jpg": {"size": 64, "sha256": ""}}})
+    broken = Verifier(archive).verify(_state(good=PostStatus.DOWNLOADED, indexed=PostStatus.DOWNLOADED), index)
+    assert broken == {"indexed": "indexed.jpg: missing"}
@@ -28,3 +28,12 @@ def test_wayback(wayback: Wayback):
     results: WaybackList = wayback.get("https://example.com")
     assert results is not None
     assert len(results) == len(mock_response_stamps)
+
+def test_wayback_cached(wayback: Wayback):
+    """ Tests that the captures of a URL are only looked up once """
+    mock_response = flexmock()
+    mock_response.should_receive("json").and_return([["timestamp", "statuscode"], ["20200101000000", "200"]])
+    flexmock(HTTPClient).should_receive("get").and_return(mock_response).once()
+
+    assert len(wayback.get("https://example.com")) == 1
+    assert len(wayback.get("https://example.com")) == 1